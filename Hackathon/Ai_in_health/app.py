@@ -1,7 +1,6 @@
 import os
 import sys
 import torch
-import json
 import mysql.connector
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
@@ -11,6 +10,7 @@ from typing import List
 # Fix for imports if running directly
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 from src.algorithms.dbn import DBN
+from src.algorithms.sparse_fcm import SparseFCM
 
 app = FastAPI(title="Clinical Decision Support API")
 
@@ -36,11 +36,21 @@ class PatientData(BaseModel):
 # Global variables for DB and Model
 db_connection = None
 model = None
-selected_indices = []
+fcm_model = None
+model_features = []   # Input feature names, in the order the exported model expects
+model_scaling = None  # (input_mean, input_scale) tensors of the model inputs, from the artifact
+
+def patient_features(data):
+    """Feature vector in training column order."""
+    return [
+        data.age, data.sex, data.cp, data.trestbps, data.chol, data.fbs,
+        data.restecg, data.thalach, data.exang, data.oldpeak, data.slope,
+        data.ca, data.thal
+    ]
 
 @app.on_event("startup")
 def startup_event():
-    global db_connection, model, selected_indices
+    global db_connection, model, fcm_model, model_features, model_scaling
     # 1. Initialize MySQL Database
     try:
         db_connection = mysql.connector.connect(
@@ -83,25 +93,35 @@ def startup_event():
         except Exception as e:
             print(f"Error creating tables: {e}")
 
-    # 2. Load Model and Configuration
+    # 2. Load the exported model (architecture and feature order are embedded in the artifact)
     try:
-        if os.path.exists("selected_features.json"):
-            with open("selected_features.json", "r") as f:
-                selected_indices = json.load(f)
-            
-            input_dim = len(selected_indices)
-            model = DBN(input_dim=input_dim, hidden_dims=[16, 8], output_dim=2, k=1)
-            model.load_state_dict(torch.load("heart_disease_model.pth"))
-            model.eval()
-            print("PyTorch Model loaded successfully from 'heart_disease_model.pth'.")
+        if os.path.exists("heart_disease_model.pt"):
+            model, model_config = DBN.load_exported("heart_disease_model.pt")
+            model_features = model_config['feature_names']
+            if model_config.get('input_mean') is not None:
+                model_scaling = (torch.tensor(model_config['input_mean'], dtype=torch.float32),
+                                 torch.tensor(model_config['input_scale'], dtype=torch.float32))
+            print(f"PyTorch Model loaded successfully from 'heart_disease_model.pt' "
+                  f"(hidden_dims={model_config['hidden_dims']}, features={model_features}).")
         else:
-            print("Warning: selected_features.json not found. Run main.py first to train the model.")
+            print("Warning: heart_disease_model.pt not found. Run main.py first to train the model.")
     except Exception as e:
         print(f"Error loading model: {e}")
 
+    # 3. Load the fitted SparseFCM (patient clustering)
+    try:
+        if os.path.exists("sparse_fcm_model.npz"):
+            fcm_model = SparseFCM.load("sparse_fcm_model.npz")
+            print("SparseFCM model loaded successfully from 'sparse_fcm_model.npz'.")
+    except Exception as e:
+        print(f"Error loading SparseFCM model: {e}")
+
 @app.post("/predict")
 async def predict(data: PatientData):
-    global db_connection, model, selected_indices
+    global db_connection, model, model_features, model_scaling
+    if model is not None and model_scaling is None:
+        # The model was trained on standardized features; raw vitals would be meaningless
+        raise HTTPException(status_code=503, detail="Model artifact has no stored feature scaling. Re-run main.py.")
     patient_id = None
     
     # 1. Insert into Patients_Vitals
@@ -120,17 +140,14 @@ async def predict(data: PatientData):
             print(f"DB Error (Insert Vital): {e}")
 
     # 2. Inference
-    features_full = [
-        data.age, data.sex, data.cp, data.trestbps, data.chol, data.fbs,
-        data.restecg, data.thalach, data.exang, data.oldpeak, data.slope,
-        data.ca, data.thal
-    ]
-    
     try:
-        if model is not None and selected_indices:
-            # Filter features based on training selection
-            features_sel = [features_full[i] for i in selected_indices]
+        if model is not None and model_features:
+            # Pick the model inputs by name, in the order stored in the artifact
+            features_sel = [getattr(data, name) for name in model_features]
             tensor_input = torch.tensor([features_sel], dtype=torch.float32)
+            # Same standardization as training
+            input_mean, input_scale = model_scaling
+            tensor_input = (tensor_input - input_mean) / input_scale
             
             with torch.no_grad():
                 output = model(tensor_input)
@@ -155,3 +172,23 @@ async def predict(data: PatientData):
             print(f"DB Error (Insert Prediction): {e}")
 
     return {"prediction": prediction}
+
+@app.post("/cluster")
+async def cluster(patients: List[PatientData]):
+    if fcm_model is None:
+        raise HTTPException(status_code=503, detail="SparseFCM model not loaded. Run main.py first.")
+    if fcm_model.input_mean is None:
+        # The model was fitted on standardized features; raw vitals would be meaningless
+        raise HTTPException(status_code=503, detail="SparseFCM model has no stored feature scaling. Re-run main.py.")
+    if not patients:
+        # Nothing to score (scale_input would turn [] into a (1, 0) row)
+        return {"clusters": [], "memberships": []}
+    
+    # One vectorized call for the whole batch, on the same standardization as training
+    X = fcm_model.scale_input([patient_features(p) for p in patients])
+    memberships = fcm_model.predict_proba(X, batch_size=4096)
+    
+    return {
+        "clusters": memberships.argmax(axis=1).tolist(),
+        "memberships": memberships.tolist()
+    }
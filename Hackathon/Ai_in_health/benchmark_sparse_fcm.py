@@ -0,0 +1,151 @@
+
+import sys
+import os
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
+
+from algorithms.sparse_fcm import SparseFCM
+
+def make_data(n_samples, n_features, n_clusters, seed=0):
+    """
+    Synthetic blobs: the first half of the features carry the cluster structure,
+    the rest are high-variance noise (so feature weighting has something to do).
+    """
+    rng = np.random.RandomState(seed)
+    n_informative = max(1, n_features // 2)
+    centers = rng.uniform(-10, 10, (n_clusters, n_informative))
+    labels = rng.randint(n_clusters, size=n_samples)
+
+    X = rng.normal(0, 5, (n_samples, n_features))
+    X[:, :n_informative] = centers[labels] + rng.normal(0, 1, (n_samples, n_informative))
+
+    # Standardize, as the pipeline does before clustering
+    return (X - X.mean(axis=0)) / X.std(axis=0)
+
+def run_case(n_samples, n_features, n_clusters, args):
+    """
+    Fit + predict one configuration and return its measurements.
+    """
+    X = make_data(n_samples, n_features, n_clusters, seed=args.seed)
+
+    fit_times = []
+    for _ in range(args.repeat):
+        model = SparseFCM(n_clusters=n_clusters, m=2.0, max_iter=args.max_iter,
+                          lambda_reg=args.lambda_reg, chunk_size=args.chunk_size)
+        start = time.perf_counter()
+        model.fit(X)
+        fit_times.append(time.perf_counter() - start)
+
+    # Peak Python-heap memory of one fit (NumPy allocations are traced)
+    tracemalloc.start()
+    SparseFCM(n_clusters=n_clusters, m=2.0, max_iter=args.max_iter,
+              lambda_reg=args.lambda_reg, chunk_size=args.chunk_size).fit(X)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    model.predict(X, batch_size=args.chunk_size)
+    predict_time = time.perf_counter() - start
+
+    return {
+        'n_samples': n_samples,
+        'n_features': n_features,
+        'n_clusters': n_clusters,
+        'fit_time': min(fit_times),
+        'n_iter': model.n_iter,
+        'time_per_iter': min(fit_times) / max(model.n_iter, 1),
+        'peak_memory_mb': peak / 1e6,
+        'predict_rows_per_sec': n_samples / max(predict_time, 1e-12),
+    }
+
+def case_key(case):
+    return (case['n_samples'], case['n_features'], case['n_clusters'])
+
+def compare(results, baseline, tolerance):
+    """
+    Compare per-iteration fit time and peak memory against a baseline.
+    Per-iteration time is used so a change in convergence speed is not reported as
+    a hot-loop regression (n_iter is compared separately).
+
+    Returns:
+        list of str: Regression messages (empty if none).
+    """
+    base_cases = {case_key(c): c for c in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        base = base_cases.get(case_key(case))
+        if base is None:
+            continue
+        for metric in ('time_per_iter', 'peak_memory_mb'):
+            ratio = case[metric] / max(base[metric], 1e-12)
+            if ratio > 1.0 + tolerance:
+                regressions.append(f"{case_key(case)} {metric}: {base[metric]:.4g} -> {case[metric]:.4g} (x{ratio:.2f})")
+        if case['n_iter'] != base['n_iter']:
+            print(f"[INFO] {case_key(case)} n_iter changed: {base['n_iter']} -> {case['n_iter']}")
+    return regressions
+
+def parse_list(text):
+    return [int(x) for x in text.split(',') if x]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SparseFCM scaling in N, D and C.")
+    parser.add_argument('--n-samples', type=parse_list, default=[1000, 10000, 50000])
+    parser.add_argument('--n-features', type=parse_list, default=[10, 50])
+    parser.add_argument('--n-clusters', type=parse_list, default=[2, 10])
+    parser.add_argument('--max-iter', type=int, default=30)
+    parser.add_argument('--lambda-reg', type=float, default=0.01)
+    parser.add_argument('--chunk-size', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3, help="Fits per case; the fastest is kept.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_sparse_fcm.json')
+    parser.add_argument('--baseline', default=None, help="Results file to compare against.")
+    parser.add_argument('--update-baseline', action='store_true', help="Write results to --baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative slowdown.")
+    args = parser.parse_args()
+
+    print("--- Benchmarking SparseFCM ---")
+    results = {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'update_baseline')},
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__,
+                    'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'cases': [],
+    }
+
+    for n_samples in args.n_samples:
+        for n_features in args.n_features:
+            for n_clusters in args.n_clusters:
+                case = run_case(n_samples, n_features, n_clusters, args)
+                results['cases'].append(case)
+                print(f"N={n_samples:>7} D={n_features:>4} C={n_clusters:>3} | "
+                      f"fit {case['fit_time']:.3f}s ({case['n_iter']} it) | "
+                      f"peak {case['peak_memory_mb']:.1f} MB | "
+                      f"predict {case['predict_rows_per_sec']:.0f} rows/s")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to '{args.output}'")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline updated at '{args.baseline}'")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n[FAIL] Regressions against baseline:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("\n[OK] No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,6 @@ import sys
 import os
 import torch
 import torch.nn as nn
-import numpy as np
 import matplotlib.pyplot as plt
 from sklearn.metrics import classification_report, confusion_matrix
 import warnings
@@ -15,8 +14,8 @@ warnings.filterwarnings('ignore')
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
 from utils.data_loader import HeartDiseaseDataLoader
-from algorithms.sparse_fcm import SparseFCM
-from algorithms.dbn import DBN
+from algorithms.sparse_fcm_torch import TorchSparseFCM
+from algorithms.dbn import DBN, parity_report
 from algorithms.taylor_bsa import TaylorBSAOptimizer
 
 def main():
@@ -45,13 +44,13 @@ def main():
 
     # 2. Feature Selection with SparseFCM
     print("\n[Step 2] Feature Selection with SparseFCM...")
-    # Convert to numpy for SparseFCM
-    X_train_np = X_train_tensor.numpy()
+    # Torch backend: runs directly on the training tensor, no NumPy round trip
     
     # Define number of clusters for FCM (Binary classification -> maybe 2 clusters?)
     n_clusters = 2
-    fcm = SparseFCM(n_clusters=n_clusters, m=2.0, max_iter=50, lambda_reg=0.05) 
-    fcm.fit(X_train_np)
+    fcm = TorchSparseFCM(n_clusters=n_clusters, m=2.0, max_iter=50, lambda_reg=0.05,
+                         dtype=X_train_tensor.dtype)
+    fcm.fit(X_train_tensor)
     
     weights = fcm.w
     print("Feature Weights:", weights)
@@ -66,7 +65,7 @@ def main():
     
     if len(selected_indices) == 0:
         print("[WARN] No features selected with threshold, fallback to all features.")
-        selected_indices = np.arange(X_train_np.shape[1])
+        selected_indices = torch.arange(X_train_tensor.shape[1])
         
     print(f"Selected Feature Indices: {selected_indices}")
     print(f"Number of Selected Features: {len(selected_indices)}")
@@ -96,43 +95,83 @@ def main():
     hidden_dims = [16, 8] 
     output_dim = 2
     
-    dbn = DBN(input_dim=input_dim, hidden_dims=hidden_dims, output_dim=output_dim, k=1)
+    # Inputs are z-scored continuous vitals: Gaussian visible units for the first RBM
+    visible_types = ['gaussian'] + ['bernoulli'] * (len(hidden_dims) - 1)
+    dbn = DBN(input_dim=input_dim, hidden_dims=hidden_dims, output_dim=output_dim, k=1,
+              visible_types=visible_types)
     print(dbn)
 
     # 4. Pre-training
     print("\n[Step 4] Pre-training DBN...")
-    # Capture loss curve? DBN.pretrain prints loss. 
-    # To plot, we might need to modify DBN to return history or just run it and assume console log is enough for now?
-    # Prompt says "plot the reconstruction loss curve". 
-    # I should verify if I can easily capture it. 
-    # I'll rely on the DBN printing for now, and maybe patch it to return history if needed?
-    # Actually, let's just make sure DBN works. I will skip plotting strictly if not asked for an artifact file, 
-    # OR I'll assume standard print is fine. The user asked "plot...". 
-    # I cannot easily modify dbn.py methods now without triggering tools again.
-    # Let's adhere strictly: "Run dbn.pretrain() and plot..."
-    # I will modify dbn.py to return losses or just assume I can't easily plot without changing DBN code.
-    # Let's assume printing is acceptable essentially, or I can subclass/wrap it?
-    # No, let's keep it simple. I will just run it.
-    
-    dbn.pretrain(train_loader_sel, epochs=10, lr=0.05)
-    
-    # 5. Optimization with TaylorBSA
-    print("\n[Step 5] Optimizing with TaylorBSA...")
+    # Gaussian first layer fits the standardized inputs directly, so fewer epochs are needed
+    pretrain_history = dbn.pretrain(train_loader_sel, epochs=5, lr=0.05, momentum=0.5,
+                                    weight_decay=1e-4, patience=2)
+    
+    # Plot Reconstruction Loss (one curve per RBM layer)
+    plt.figure(figsize=(10, 5))
+    for layer_idx, layer_errors in enumerate(pretrain_history):
+        plt.plot(range(1, len(layer_errors) + 1), layer_errors, marker='o', label=f'RBM Layer {layer_idx+1}')
+    plt.title('DBN Pre-training Reconstruction Error')
+    plt.xlabel('Epoch')
+    plt.ylabel('Reconstruction Error')
+    plt.legend()
+    plt.savefig('pretraining_loss.png')
+    print("Saved pretraining loss plot to 'pretraining_loss.png'")
+    
+    # 5. Supervised Training
+    # 'bsa': Taylor-BSA only, 'gradient': backprop fine-tuning only,
+    # 'hybrid': fine-tune first, then seed the swarm from the fine-tuned weights
+    training_mode = 'hybrid'
     loss_fn = nn.CrossEntropyLoss()
-    optimizer = TaylorBSAOptimizer(dbn, population_size=10, prob_foraging=0.8, prob_flight=0.1)
     
-    epochs = 15
-    bsa_losses = []
+    finetune_losses = []
+    if training_mode in ('gradient', 'hybrid'):
+        print("\n[Step 5a] Fine-tuning DBN with backpropagation...")
+        # Warm up the classifier on the pretrained features before touching the RBMs
+        finetune_losses = dbn.finetune(train_loader_sel, epochs=20, lr=1e-2, loss_fn=loss_fn,
+                                       rbm_lr_scale=0.1, freeze_epochs=5)
     
-    for epoch in range(epochs):
-        loss = optimizer.step(train_loader_sel, loss_fn)
-        bsa_losses.append(loss)
-        print(f"Epoch {epoch+1}/{epochs} - TaylorBSA Best Loss: {loss:.4f}")
+    bsa_losses = []
+    if training_mode in ('bsa', 'hybrid'):
+        print("\n[Step 5b] Optimizing with TaylorBSA...")
+        # In hybrid mode the swarm explores a tighter region around the fine-tuned optimum
+        optimizer = TaylorBSAOptimizer(dbn, population_size=10, prob_foraging=0.8, prob_flight=0.1,
+                                       noise_range=0.1 if training_mode == 'hybrid' else 0.5,
+                                       keep_initial=training_mode == 'hybrid',
+                                       checkpoint_path='taylor_bsa_checkpoint.pt', checkpoint_every=5)
+        
+        epochs = 15
+        # Resume an interrupted run from its last checkpoint. A finished run deletes its
+        # checkpoint, so a leftover one at epoch >= epochs is stale and must not
+        # overwrite the freshly trained DBN.
+        if os.path.exists(optimizer.checkpoint_path):
+            state = torch.load(optimizer.checkpoint_path, map_location=optimizer.device, weights_only=False)
+            if state.get('epoch', 0) >= epochs:
+                print(f"[WARN] Ignoring finished checkpoint '{optimizer.checkpoint_path}'; starting from scratch.")
+            else:
+                try:
+                    optimizer.load_state_dict(state)
+                    print(f"[INFO] Resumed TaylorBSA from '{optimizer.checkpoint_path}' at epoch {optimizer.epoch}.")
+                except ValueError as e:
+                    print(f"[WARN] Ignoring incompatible checkpoint ({e}); starting from scratch.")
+        
+        for epoch in range(optimizer.epoch, epochs):
+            loss = optimizer.step(train_loader_sel, loss_fn)
+            bsa_losses.append(loss)
+            print(f"Epoch {epoch+1}/{epochs} - TaylorBSA Best Loss: {loss:.4f}")
+        
+        # The run is complete: drop the checkpoint so the next run starts fresh
+        if os.path.exists(optimizer.checkpoint_path):
+            os.remove(optimizer.checkpoint_path)
         
     # Plot Optimization Loss
     plt.figure(figsize=(10, 5))
-    plt.plot(bsa_losses, label='TaylorBSA Loss')
-    plt.title('DBN Optimization with Taylor-BSA')
+    if finetune_losses:
+        plt.plot(range(1, len(finetune_losses) + 1), finetune_losses, label='Fine-tuning Loss')
+    if bsa_losses:
+        start = len(finetune_losses)
+        plt.plot(range(start + 1, start + len(bsa_losses) + 1), bsa_losses, label='TaylorBSA Loss')
+    plt.title(f'DBN Optimization ({training_mode})')
     plt.xlabel('Epoch')
     plt.ylabel('Loss')
     plt.legend()
@@ -159,11 +198,27 @@ def main():
     print("\nConfusion Matrix:")
     print(confusion_matrix(y_true, y_pred))
 
+    # Serving variants: fused-sigmoid float and dynamic int8, checked against the float model
+    print("\nInference Variants (test split):")
+    report = parity_report(dbn, {'fused': dbn.inference_model(),
+                                 'int8': dbn.inference_model(quantize=True)}, test_loader_sel)
+    for name, row in report.items():
+        print(f"  {name:>6}: accuracy={row['accuracy']:.4f} agreement={row['agreement']:.4f} "
+              f"max|dlogit|={row['max_abs_diff']:.2e} time={row['time'] * 1e3:.2f} ms")
+
     # 7. Save Model
     print("\n[Step 7] Saving Model...")
     torch.save(dbn.state_dict(), 'heart_disease_model.pth')
     print("Model saved to 'heart_disease_model.pth'")
     
+    # Frozen TorchScript artifact for serving: embeds the architecture, input feature order
+    # and the standardization of the selected columns, so raw vitals can be scored
+    feature_names = [HeartDiseaseDataLoader.COLUMN_NAMES[i] for i in selected_indices.tolist()]
+    dbn.export('heart_disease_model.pt', feature_names=feature_names, selected_indices=selected_indices.tolist(),
+               input_mean=data_loader.scaler.mean_[selected_indices.tolist()],
+               input_scale=data_loader.scaler.scale_[selected_indices.tolist()])
+    print("Inference artifact saved to 'heart_disease_model.pt'")
+    
     import json
     with open('selected_features.json', 'w') as f:
         # Convert to list if numpy array
@@ -171,6 +226,13 @@ def main():
         json.dump(sel_list, f)
     print("Selected feature indices saved to 'selected_features.json'")
     
+    # Store the feature standardization with the clustering model so raw vitals can be scored
+    fcm_artifact = fcm.to_numpy()
+    fcm_artifact.input_mean = data_loader.scaler.mean_
+    fcm_artifact.input_scale = data_loader.scaler.scale_
+    fcm_artifact.save('sparse_fcm_model.npz')
+    print("SparseFCM model saved to 'sparse_fcm_model.npz'")
+    
     print("\n--- Pipeline Complete ---")
 
 if __name__ == "__main__":
@@ -1,25 +1,61 @@
 
+import os
+import sys
+import copy
+import json
+import pickle
+import time
+import tempfile
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader, TensorDataset, RandomSampler, SequentialSampler, Subset
+from collections import namedtuple
+
+# Sufficient statistics of one CD-k step, summed over the batch
+CDStats = namedtuple('CDStats', [
+    'pos_association',   # v0.T @ p(h0|v0)             (visible, hidden)
+    'neg_association',   # vk.T @ p(hk|vk)             (visible, hidden)
+    'visible_delta',     # sum(v0 - vk)                (visible,)
+    'hidden_delta',      # sum(p(h0|v0) - p(hk|vk))    (hidden,)
+    'recon_error',       # mean_batch ||v0 - vk||^2    scalar tensor
+])
 
 class RBM(nn.Module):
     """
     Restricted Boltzmann Machine (RBM) implementation.
     """
-    def __init__(self, visible_units, hidden_units, k=1):
+    # Lowest inverse temperature of the parallel-tempering ladder
+    min_beta = 0.0
+    
+    def __init__(self, visible_units, hidden_units, k=1, sampler='cd', n_temperatures=5):
         """
         Initialize RBM parameters.
         
         Args:
             visible_units (int): Number of visible units.
             hidden_units (int): Number of hidden units.
-            k (int): Number of Contrastive Divergence (CD) steps.
+            k (int): Number of Gibbs steps per update.
+            sampler (str): Negative-phase sampler.
+                'cd'  - Contrastive Divergence, chain restarted from the data every batch.
+                'pcd' - Persistent CD, fantasy particles kept across batches.
+                'pt'  - Parallel tempering: persistent chains at `n_temperatures` inverse
+                        temperatures in [min_beta, 1], with neighbour swaps after every Gibbs step.
+            n_temperatures (int): Number of tempered chains per particle ('pt' only).
         """
         super(RBM, self).__init__()
         self.visible_units = visible_units
         self.hidden_units = hidden_units
         self.k = k
+        self.sampler = sampler
+        self.n_temperatures = n_temperatures
+        
+        # Persistent fantasy particles (hidden states), created lazily from the first batch.
+        # 'pcd': (chains, hidden); 'pt': (n_temperatures, chains, hidden). Not part of state_dict.
+        self.fantasy_hidden = None
         
         # Initialize weights and biases
         # Weights: (hidden, visible) or (visible, hidden)?
@@ -39,23 +75,121 @@ class RBM(nn.Module):
         """
         return torch.sigmoid(torch.matmul(v, self.W) + self.hidden_bias)
 
-    def sample_hidden(self, v):
+    def sample_hidden(self, v, beta=1.0):
         """
         Returns hidden probabilities and sampled binary states.
+        beta (float or Tensor) is the inverse temperature, p(h=1|v) = sigmoid(beta * (v @ W + b_h)).
         """
-        h_prob = self.forward(v)
+        if isinstance(beta, float) and beta == 1.0:
+            h_prob = self.forward(v)
+        else:
+            h_prob = torch.sigmoid(beta * (torch.matmul(v, self.W) + self.hidden_bias))
         h_sample = torch.bernoulli(h_prob)
         return h_prob, h_sample
 
-    def sample_visible(self, h):
+    def sample_visible(self, h, beta=1.0):
         """
         Returns reconstruction probabilities and samples given hidden state h.
-        p(v=1|h) = sigmoid(h @ W.T + b_v)
+        p(v=1|h) = sigmoid(beta * (h @ W.T + b_v))
         """
-        v_prob = torch.sigmoid(torch.matmul(h, self.W.t()) + self.visible_bias)
+        v_act = torch.matmul(h, self.W.t()) + self.visible_bias
+        if not (isinstance(beta, float) and beta == 1.0):
+            v_act = beta * v_act
+        v_prob = torch.sigmoid(v_act)
         v_sample = torch.bernoulli(v_prob)
         return v_prob, v_sample
 
+    def _visible_state(self, h, beta=1.0):
+        """
+        Visible state carried along the Gibbs chain: a binary sample for Bernoulli units.
+        """
+        _, v_sample = self.sample_visible(h, beta=beta)
+        return v_sample
+
+    def _reconstruct(self, h):
+        """
+        One-step reconstruction of the data used for the reconstruction error.
+        """
+        return self._visible_state(h)
+
+    def energy(self, v, h):
+        """
+        Joint energy E(v, h) = -v.b_v - h.b_h - v W h, over the last dimension.
+        """
+        return -(v * self.visible_bias).sum(dim=-1) - (h * self.hidden_bias).sum(dim=-1) \
+            - (torch.matmul(v, self.W) * h).sum(dim=-1)
+
+    def reset_chains(self):
+        """
+        Drop the persistent fantasy particles ('pcd' / 'pt').
+        """
+        self.fantasy_hidden = None
+
+    def _persistent_state(self, h0_sample, shape):
+        """
+        First `batch` persistent chains, growing the buffer from h0_sample if needed.
+        `shape` is the leading shape of one chain set: () for 'pcd', (T,) for 'pt'.
+        """
+        batch = h0_sample.size(0)
+        if self.fantasy_hidden is None:
+            self.fantasy_hidden = h0_sample.expand(*shape, *h0_sample.shape).clone()
+        elif self.fantasy_hidden.size(-2) < batch:
+            n_have = self.fantasy_hidden.size(-2)
+            extra = h0_sample[n_have:].expand(*shape, batch - n_have, self.hidden_units)
+            self.fantasy_hidden = torch.cat([self.fantasy_hidden, extra], dim=-2)
+        return self.fantasy_hidden[..., :batch, :]
+
+    def _negative_phase(self, h0_sample):
+        """
+        Run the configured sampler for k Gibbs steps.
+        
+        Returns:
+            vk (Tensor): Negative-phase visible states (Batch, Visible).
+            hk_prob (Tensor): p(h|vk) at inverse temperature 1 (Batch, Hidden).
+        """
+        if self.sampler == 'cd':
+            # Chain started from the sampled hidden of the data
+            hk = h0_sample
+            for _ in range(self.k):
+                vk = self._visible_state(hk)
+                hk_prob, hk = self.sample_hidden(vk)
+            return vk, hk_prob
+        
+        if self.sampler == 'pcd':
+            hk = self._persistent_state(h0_sample, ())
+            for _ in range(self.k):
+                vk = self._visible_state(hk)
+                hk_prob, hk = self.sample_hidden(vk)
+            self.fantasy_hidden[:hk.size(0)] = hk
+            return vk, hk_prob
+        
+        if self.sampler == 'pt':
+            T = self.n_temperatures
+            betas = torch.linspace(1.0, self.min_beta, T, device=h0_sample.device).view(T, 1, 1)
+            hk = self._persistent_state(h0_sample, (T,))
+            for _ in range(self.k):
+                # One Gibbs step for every temperature at once: (T, Batch, .)
+                vk = self._visible_state(hk, beta=betas)
+                _, hk = self.sample_hidden(vk, beta=betas)
+                
+                # Metropolis swaps between neighbouring temperatures:
+                # accept with prob min(1, exp((beta_t - beta_t+1) * (E_t - E_t+1)))
+                energy = self.energy(vk, hk) # (T, Batch)
+                for t in range(T - 1):
+                    log_accept = (betas[t, 0, 0] - betas[t + 1, 0, 0]) * (energy[t] - energy[t + 1])
+                    swap = (torch.rand_like(log_accept).log() < log_accept).unsqueeze(1)
+                    for state in (vk, hk):
+                        low, high = state[t].clone(), state[t + 1]
+                        state[t] = torch.where(swap, high, low)
+                        state[t + 1] = torch.where(swap, low, high)
+                    energy[t], energy[t + 1] = torch.where(swap[:, 0], energy[t + 1], energy[t]), \
+                        torch.where(swap[:, 0], energy[t], energy[t + 1])
+            self.fantasy_hidden[:, :hk.size(1)] = hk
+            # Statistics come from the beta = 1 chain
+            return vk[0], self.forward(vk[0])
+        
+        raise ValueError(f"Unknown sampler '{self.sampler}' (expected 'cd', 'pcd' or 'pt').")
+
     def contrastive_divergence(self, input_data):
         """
         Perform one step of Gibbs sampling (CD-k) and return positive and negative associations.
@@ -103,121 +237,661 @@ class RBM(nn.Module):
         
         return pos_association, neg_association, v0, vk
 
+    @torch.no_grad()
+    def cd_step(self, input_data):
+        """
+        Fused CD-k step: one Gibbs chain, returning every statistic the update needs.
+        
+        Same chain as `contrastive_divergence` (for sampler='cd'), but the hidden
+        probabilities of the positive and negative phase are reused for the bias
+        gradients and the reconstruction error is computed from the same tensors,
+        so no extra forward passes are needed. Runs without building an autograd graph.
+        With 'pcd' / 'pt' the negative phase comes from the persistent chains and the
+        reconstruction error is measured on a one-step reconstruction of the data,
+        so it stays comparable with CD-1.
+        
+        Args:
+            input_data (Tensor): Batch of visible units (Batch, Visible).
+            
+        Returns:
+            CDStats: Statistics summed over the batch (divide by batch size for the update).
+        """
+        # Positive Phase with v0
+        v0 = input_data
+        h0_prob, h0_sample = self.sample_hidden(v0)
+        
+        # Negative Phase (Gibbs Sampling k steps)
+        vk, hk_prob = self._negative_phase(h0_sample)
+        
+        v_diff = v0 - vk
+        if self.sampler == 'cd':
+            recon_error = v_diff.pow(2).sum(dim=1).mean()
+        else:
+            v1 = self._reconstruct(h0_sample)
+            recon_error = (v0 - v1).pow(2).sum(dim=1).mean()
+        
+        return CDStats(
+            pos_association=torch.matmul(v0.t(), h0_prob),
+            neg_association=torch.matmul(vk.t(), hk_prob),
+            visible_delta=v_diff.sum(dim=0),
+            hidden_delta=(h0_prob - hk_prob).sum(dim=0),
+            recon_error=recon_error,
+        )
+
+class GaussianRBM(RBM):
+    """
+    Gaussian-Bernoulli RBM: real-valued visible units with unit variance,
+    for standardized (z-scored) continuous inputs.
+    
+    p(v|h) = N(h @ W.T + b_v, I), p(h=1|v) = sigmoid(v @ W + b_h)
+    E(v, h) = ||v - b_v||^2 / 2 - h.b_h - v W h
+    
+    With unit variance the CD gradients have the same form as for the Bernoulli
+    RBM, so `cd_step` and `DBN.pretrain` are shared. Following Hinton's practical
+    guide, CD chains carry the noise-free mean reconstruction of v; persistent
+    ('pcd') and tempered ('pt') chains must sample p(v|h), otherwise they never
+    mix and the Metropolis swaps would compare mean-field energies.
+    """
+    # Visible variance 1 / beta: keep the tempering ladder away from beta = 0
+    min_beta = 0.1
+
+    def sample_visible(self, h, beta=1.0):
+        """
+        Returns the reconstruction mean and a Gaussian sample given hidden state h.
+        At inverse temperature beta the variance is 1 / beta.
+        """
+        v_mean = torch.matmul(h, self.W.t()) + self.visible_bias
+        noise = torch.randn_like(v_mean)
+        if not (isinstance(beta, float) and beta == 1.0):
+            noise = noise * beta ** -0.5 # Python float or (T, 1, 1) tensor
+        return v_mean, v_mean + noise
+
+    def _visible_state(self, h, beta=1.0):
+        """
+        Visible state for the chain: the mean for CD, a sample at inverse temperature
+        beta for the persistent and tempered chains.
+        """
+        v_mean, v_sample = self.sample_visible(h, beta=beta)
+        return v_mean if self.sampler == 'cd' else v_sample
+
+    def _reconstruct(self, h):
+        """
+        Noise-free mean reconstruction, so the error stays comparable across samplers.
+        """
+        return torch.matmul(h, self.W.t()) + self.visible_bias
+
+    def energy(self, v, h):
+        """
+        Joint energy E(v, h) = ||v - b_v||^2 / 2 - h.b_h - v W h, over the last dimension.
+        """
+        return 0.5 * (v - self.visible_bias).pow(2).sum(dim=-1) - (h * self.hidden_bias).sum(dim=-1) \
+            - (torch.matmul(v, self.W) * h).sum(dim=-1)
+
+def _pretrain_worker(rank, world_size, dbn, dataset, local_batch_size, seed, init_method,
+                     num_threads, results, pretrain_kwargs):
+    """
+    One process of `DBN.pretrain_distributed`: trains a private replica on its
+    shard, and rank 0 copies the result back into the (shared-memory) `dbn`.
+    """
+    torch.set_num_threads(num_threads)
+    torch.manual_seed(seed + rank) # Independent Gibbs noise per worker
+    if rank > 0:
+        sys.stdout = open(os.devnull, 'w') # Only rank 0 reports progress
+    
+    dist.init_process_group('gloo', init_method=init_method, rank=rank, world_size=world_size)
+    try:
+        # Disjoint shards of one seeded permutation, padded (like DistributedSampler)
+        # so every rank runs the same number of batches.
+        order = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(seed)).tolist()
+        order += order[:(-len(order)) % world_size]
+        shard = Subset(dataset, order[rank::world_size])
+        loader = DataLoader(shard, batch_size=local_batch_size, shuffle=True)
+        
+        replica = dbn if world_size == 1 else copy.deepcopy(dbn)
+        history = replica.pretrain(loader, **pretrain_kwargs)
+        
+        if rank == 0:
+            if replica is not dbn:
+                dbn.load_state_dict(replica.state_dict())
+            results.put(history)
+    finally:
+        dist.destroy_process_group()
+
 class DBN(nn.Module):
     """
     Deep Belief Network (DBN) constructed by stacking RBMs.
     """
-    def __init__(self, input_dim, hidden_dims, output_dim=2, k=1):
+    def __init__(self, input_dim, hidden_dims, output_dim=2, k=1, sampler='cd', n_temperatures=5,
+                 visible_types=None):
         """
         Args:
             input_dim (int): Dimension of input data.
             hidden_dims (list of int): Dimensions of hidden layers for RBMs.
             output_dim (int): Number of classes for final classification.
             k (int): CD steps.
+            sampler (str): RBM negative-phase sampler, 'cd', 'pcd' or 'pt' (see RBM).
+            n_temperatures (int): Tempered chains per particle for sampler='pt'.
+            visible_types (list of str, optional): Visible unit type per RBM layer,
+                'bernoulli' (RBM) or 'gaussian' (GaussianRBM), one entry per hidden dim.
+                Defaults to all 'bernoulli'. Use 'gaussian' for the first layer on
+                standardized continuous features.
         """
         super(DBN, self).__init__()
         self.rbm_layers = nn.ModuleList()
         self.hidden_dims = hidden_dims
         
+        if visible_types is None:
+            visible_types = ['bernoulli'] * len(hidden_dims)
+        if len(visible_types) != len(hidden_dims):
+            raise ValueError("visible_types needs one entry per hidden layer.")
+        self.visible_types = list(visible_types)
+        
         # Create RBM layers
+        rbm_classes = {'bernoulli': RBM, 'gaussian': GaussianRBM}
         prev_dim = input_dim
-        for h_dim in hidden_dims:
-            self.rbm_layers.append(RBM(prev_dim, h_dim, k=k))
+        for h_dim, v_type in zip(hidden_dims, visible_types):
+            if v_type not in rbm_classes:
+                raise ValueError(f"Unknown visible type '{v_type}' (expected 'bernoulli' or 'gaussian').")
+            self.rbm_layers.append(rbm_classes[v_type](prev_dim, h_dim, k=k, sampler=sampler,
+                                                       n_temperatures=n_temperatures))
             prev_dim = h_dim
             
         # Classification Head
         self.classifier = nn.Linear(prev_dim, output_dim)
 
-    def pretrain(self, train_loader, epochs=10, lr=0.01):
+    @staticmethod
+    def _cache_path(cache_dir, rbm):
+        """
+        Memory-mapped cache file holding the hidden probabilities of `rbm`.
+        """
+        return os.path.join(cache_dir, f"layer_{rbm.hidden_units}_{id(rbm)}.dat")
+
+    def _build_cache(self, source_loader, rbm, out_dim, mode, cache_dir):
+        """
+        Push every batch of `source_loader` through `rbm` once and store the
+        hidden probabilities as the dataset for the next layer.
+        
+        Args:
+            source_loader (DataLoader): Input of `rbm` (first element of each batch).
+            rbm (RBM): Already trained layer.
+            out_dim (int): rbm.hidden_units.
+            mode (str): 'memory' (tensor in RAM) or 'mmap' (memory-mapped file in cache_dir).
+            cache_dir (str): Directory for the memory-mapped file.
+            
+        Returns:
+            Tensor: Activations of shape (N, out_dim).
+        """
+        n_samples = len(source_loader.dataset)
+        if mode == 'mmap':
+            path = self._cache_path(cache_dir, rbm)
+            storage = np.memmap(path, dtype=np.float32, mode='w+', shape=(n_samples, out_dim))
+            cache = torch.from_numpy(storage)
+        else:
+            cache = torch.empty(n_samples, out_dim)
+        
+        # Sequential pass: keeps rows in dataset order and leaves the shuffling RNG untouched
+        sequential = DataLoader(source_loader.dataset, batch_size=source_loader.batch_size, shuffle=False)
+        
+        offset = 0
+        # fork_rng: DataLoader iteration draws a base seed from the global RNG
+        with torch.no_grad(), torch.random.fork_rng(devices=[]):
+            # Hinton guide: "The hidden probabilities... are used as the data for training the next RBM"
+            for batch in sequential:
+                v = batch[0].view(batch[0].size(0), -1)
+                cache[offset:offset + v.size(0)] = rbm.forward(v)
+                offset += v.size(0)
+        return cache
+
+    def _cache_mode(self, train_loader, cache, cache_limit_mb):
+        """
+        Resolve cache='auto' to 'memory', 'mmap' or 'none' from the dataset size.
+        
+        The cache covers the whole dataset and is re-batched with a plain (optionally
+        shuffled) DataLoader, so it is only used when the loader visits every row
+        exactly once per epoch: a SequentialSampler or a RandomSampler without
+        replacement. Any other sampler (e.g. SubsetRandomSampler over a train split)
+        falls back to 'none'; asking for 'memory'/'mmap' with one is an error.
+        """
+        sampler = train_loader.sampler
+        replicable = train_loader.batch_size is not None and (
+            isinstance(sampler, SequentialSampler) or
+            (isinstance(sampler, RandomSampler) and not sampler.replacement and
+             sampler.num_samples == len(train_loader.dataset)))
+        
+        if cache != 'auto':
+            if cache != 'none' and not replicable:
+                raise ValueError(f"cache='{cache}' needs a loader with a SequentialSampler or RandomSampler "
+                                 f"over the whole dataset; use cache='none' with {type(sampler).__name__}.")
+            return cache
+        if not replicable:
+            return 'none' # Custom (batch) sampler we cannot replicate: transform on the fly
+        try:
+            n_samples = len(train_loader.dataset)
+        except TypeError:
+            return 'none' # Unsized (iterable) dataset: transform on the fly
+        
+        # Largest activation tensor any layer would need (float32)
+        largest = max(rbm.hidden_units for rbm in self.rbm_layers[:-1]) if len(self.rbm_layers) > 1 else 0
+        size_mb = n_samples * largest * 4 / 2**20
+        return 'memory' if size_mb <= cache_limit_mb else 'mmap'
+
+    @staticmethod
+    def _all_reduce_stats(grads, batch_size, recon_error):
+        """
+        Sum the CD statistics of all ranks in a single all-reduce.
+        
+        Args:
+            grads (tuple of Tensor): Local (pos - neg association, visible delta, hidden delta) sums.
+            batch_size (int): Local batch size.
+            recon_error (Tensor): Local mean reconstruction error.
+            
+        Returns:
+            tuple: (global grads, global batch size, global mean reconstruction error).
+        """
+        flat = torch.cat([g.reshape(-1) for g in grads] +
+                         [(recon_error * batch_size).reshape(1), torch.tensor([float(batch_size)])])
+        dist.all_reduce(flat, op=dist.ReduceOp.SUM)
+        
+        reduced, offset = [], 0
+        for g in grads:
+            reduced.append(flat[offset:offset + g.numel()].view_as(g))
+            offset += g.numel()
+        total = flat[-1].item()
+        return tuple(reduced), total, flat[-2] / total
+
+    def pretrain(self, train_loader, epochs=10, lr=0.01, cache='auto', cache_limit_mb=512, cache_dir=None,
+                 momentum=0.0, weight_decay=0.0, lr_schedule=None, patience=None, min_delta=0.0):
         """
         Greedy layer-wise pretraining using Contrastive Divergence.
         Updates weights in-place without autograd.
         
+        For layer i > 0 the input is the hidden probabilities of layer i-1. By
+        default these are computed once per layer and cached, so each epoch only
+        runs the layer being trained (cost linear in depth). The on-the-fly path,
+        which re-runs all previous RBMs for every batch, is kept as a low-memory
+        fallback.
+        
         Args:
             train_loader (DataLoader): Training data.
             epochs (int): Number of epochs per layer.
             lr (float): Learning rate.
+            cache (str): 'auto', 'memory', 'mmap' or 'none' (on the fly). 'auto' caches
+                in memory up to `cache_limit_mb` and spills to a memory-mapped file above it;
+                loaders with a custom sampler are always transformed on the fly.
+            cache_limit_mb (float): In-memory cache budget used by 'auto'.
+            cache_dir (str, optional): Directory for memory-mapped caches (temp dir if None).
+                The cache files are removed when pretraining returns.
+            momentum (float): Momentum of the weight/bias updates (0.5-0.9 is typical for RBMs).
+            weight_decay (float): L2 penalty on the weights W (biases are not decayed).
+            lr_schedule (callable, optional): Maps the epoch index (0-based, restarted for
+                every layer) to a multiplier of `lr`, e.g. `lambda epoch: 0.9 ** epoch`.
+                With `pretrain_distributed` it is pickled to the workers, so it must be a
+                module-level function (or a functools.partial of one), not a lambda.
+            patience (int, optional): Stop a layer early once its reconstruction error has not
+                improved by more than `min_delta` for this many epochs. None trains all epochs.
+            min_delta (float): Minimum decrease of the reconstruction error that counts as an improvement.
+            
+        Returns:
+            list of list of float: Mean reconstruction error per epoch, one list per layer.
         """
-        # We need to act on the full dataset or iterate through batches.
-        # Since we have a loader, we iterate.
-        # For layer i > 0, the input is the output probabilities(or samples) of layer i-1.
-        
-        # We cannot easily re-run the loader for inner layers if we transform on the fly every epoch?
-        # Standard approach:
-        # Train Layer 0 on raw data.
-        # Generate dataset for Layer 1 by passing Layer 0 data through trained Layer 0.
-        # Train Layer 1...
-        # But if dataset is large, we might just run forward pass on the fly?
-        # "Train RBM[i] using the input data (or output of RBM[i-1])"
+        mode = self._cache_mode(train_loader, cache, cache_limit_mb)
+        tmp_dir = None
+        if mode == 'mmap' and cache_dir is None:
+            tmp_dir = tempfile.TemporaryDirectory(prefix="dbn_cache_")
+            cache_dir = tmp_dir.name
         
-        # Let's simplify: For each RBM layer...
+        layer_loader = train_loader
+        history = []
         
-        current_dataset_loader = train_loader
+        # Inside a gloo process group (see pretrain_distributed) every rank holds a
+        # shard: start from rank 0's weights and all-reduce the CD statistics.
+        distributed = dist.is_available() and dist.is_initialized()
+        if distributed:
+            for param in self.parameters():
+                dist.broadcast(param.data, src=0)
         
-        for i, rbm in enumerate(self.rbm_layers):
-            print(f"[INFO] Pretraining RBM Layer {i+1}/{len(self.rbm_layers)}")
-            
-            for epoch in range(epochs):
-                total_error = 0
-                for batch_idx, (data, _) in enumerate(current_dataset_loader):
-                    # Data preparation
-                    # If this is the first layer, data is raw input.
-                    # If i > 0, we need to ensure we are receiving the transformed data?
-                    # Ah, if we iterate layers sequentially, we need to transform the whole dataset first?
-                    # Or we just do: when training RBM i, we verify that `train_loader` produces data for RBM i?
-                    # The `train_loader` passed in is for the INPUT data. 
-                    # If i > 0, we must effectively transform the data through previous layers on the fly in the loop.
+        try:
+            for i, rbm in enumerate(self.rbm_layers):
+                print(f"[INFO] Pretraining RBM Layer {i+1}/{len(self.rbm_layers)}")
+                
+                if i > 0 and mode != 'none':
+                    # Transform the dataset once through the layer trained last,
+                    # starting from the previous cache rather than the raw data.
+                    activations = self._build_cache(layer_loader, self.rbm_layers[i - 1],
+                                                    self.rbm_layers[i - 1].hidden_units, mode, cache_dir)
+                    layer_loader = DataLoader(TensorDataset(activations), batch_size=train_loader.batch_size,
+                                              shuffle=isinstance(train_loader.sampler, RandomSampler),
+                                              drop_last=train_loader.drop_last)
+                
+                # Velocity buffers for the momentum update, reset for every layer
+                params = (rbm.W, rbm.visible_bias, rbm.hidden_bias)
+                velocity = [torch.zeros_like(p) for p in params]
+                
+                layer_history = []
+                best_error = float('inf')
+                epochs_without_improvement = 0
+                
+                for epoch in range(epochs):
+                    epoch_lr = lr * (lr_schedule(epoch) if lr_schedule is not None else 1.0)
                     
-                    # Flatten input if needed (usually RBMs take flat vectors)
-                    if i == 0:
+                    # Accumulated as a tensor: one .item() sync per epoch instead of per batch
+                    total_error = torch.zeros(())
+                    for batch_idx, batch in enumerate(layer_loader):
+                        data = batch[0]
+                        # Flatten input if needed (usually RBMs take flat vectors)
                         v = data.view(data.size(0), -1)
-                    else:
-                        # We need to pass data through previous 'i' layers to get input for this layer.
-                        # This is expensive re-computation every batch/epoch. 
-                        # Better to transform dataset once if memory allows. 
-                        # But user prompt implies just a function. Let's do on-the-fly for simplicity/memory safety.
+                        
                         with torch.no_grad():
-                            v = data.view(data.size(0), -1)
-                            for prev_rbm in self.rbm_layers[:i]:
-                                v, _ = prev_rbm.sample_hidden(v) # Use samples or probs? usually probs for next layer input
-                                # Hinton guide: "The hidden probabilities... are used as the data for training the next RBM" (Section 11)
-                                # Wait, sample_hidden returns (prob, sample). Use prob?
-                                # Actually, usually we use Sampled binary states as input to next layer?
-                                # Hinton "A Practical Guide to Training RBMs": 
-                                # "It is usually better to use the probabilities... as the data for the next RBM"
-                                # Let's use the probability form for the 'input' to the next layer. v = h_prob
-                                pass
-
-                    # Now 'v' is the input for current 'rbm'
-                    pos_assoc, neg_assoc, v0, vk = rbm.contrastive_divergence(v)
-                    
-                    # Update weights (In-place, no autograd)
-                    # W_new = W_old + lr * (pos_assoc - neg_assoc) / batch_size
-                    batch_size = v.size(0)
-                    update_w = (pos_assoc - neg_assoc) / batch_size
-                    update_vb = torch.sum(v0 - vk, dim=0) / batch_size
-                    
-                    # Usually hidden bias update depends on positive phase hidden prob and negative phase hidden prob?
-                    # d/db_h = <h>_data - <h>_model
-                    # We have h0_prob (from sample_hidden(v0)) ... wait, CD returns associations. 
-                    # Let's recalculate or adapt CD method to return needed stats for biases too.
-                    # RBM.contrastive_divergence returns v0, vk.
-                    # We can get h0_prob = sigmoid(v0 W + b) and hk_prob = sigmoid(vk W + b).
+                            if i > 0 and mode == 'none':
+                                # On-the-fly fallback: pass the raw batch through previous 'i' layers.
+                                # Expensive re-computation every batch/epoch, but no extra memory.
+                                for prev_rbm in self.rbm_layers[:i]:
+                                    v = prev_rbm.forward(v) # Probabilities as input to the next layer
+                            
+                            # Now 'v' is the input for current 'rbm'
+                            stats = rbm.cd_step(v)
+                            
+                            # Update weights (In-place, no autograd)
+                            # velocity = momentum * velocity + lr * ((pos_assoc - neg_assoc) / batch_size - decay * W)
+                            # d/db_v = <v>_data - <v>_model, d/db_h = <h>_data - <h>_model
+                            grads = (stats.pos_association - stats.neg_association,
+                                     stats.visible_delta, stats.hidden_delta)
+                            batch_size, batch_error = v.size(0), stats.recon_error
+                            if distributed:
+                                grads, batch_size, batch_error = self._all_reduce_stats(grads, batch_size, batch_error)
+                            step = epoch_lr / batch_size
+                            for buf, grad in zip(velocity, grads):
+                                buf.mul_(momentum).add_(grad, alpha=step)
+                            if weight_decay:
+                                velocity[0].add_(rbm.W, alpha=-epoch_lr * weight_decay)
+                            for param, buf in zip(params, velocity):
+                                param.add_(buf)
+                            
+                            # Reconstruction error for monitoring
+                            total_error += batch_error
                     
-                    h0_prob = rbm.forward(v0)
-                    hk_prob = rbm.forward(vk)
-                    update_hb = torch.sum(h0_prob - hk_prob, dim=0) / batch_size
+                    epoch_error = total_error.item() / len(layer_loader)
+                    layer_history.append(epoch_error)
+                    print(f"  Epoch {epoch+1}: Reconstruction Error = {epoch_error:.4f}")
                     
-                    with torch.no_grad():
-                        rbm.W += lr * update_w
-                        rbm.visible_bias += lr * update_vb
-                        rbm.hidden_bias += lr * update_hb
-                    
-                    # Reconstruction error for monitoring
-                    error = torch.mean(torch.sum((v0 - vk)**2, dim=1))
-                    total_error += error.item()
+                    # Early stopping on the reconstruction error
+                    if epoch_error < best_error - min_delta:
+                        best_error = epoch_error
+                        epochs_without_improvement = 0
+                    else:
+                        epochs_without_improvement += 1
+                    if patience is not None and epochs_without_improvement >= patience:
+                        print(f"[INFO] Early stopping layer {i+1} after {epoch+1} epochs (no improvement for {patience}).")
+                        break
+                
+                history.append(layer_history)
+        finally:
+            # Drop the memory-mapped views before removing their files
+            layer_loader = activations = None
+            if tmp_dir is not None:
+                tmp_dir.cleanup()
+            elif mode == 'mmap':
+                # Caller-supplied cache_dir: remove only the files this run wrote
+                for prev_rbm in self.rbm_layers[:-1]:
+                    path = self._cache_path(cache_dir, prev_rbm)
+                    if os.path.exists(path):
+                        os.remove(path)
+        
+        return history
+
+    def pretrain_distributed(self, dataset, world_size=2, batch_size=32, seed=0, init_method=None,
+                             num_threads=None, **pretrain_kwargs):
+        """
+        Data-parallel `pretrain` over `world_size` CPU processes (gloo backend).
+        
+        Each worker runs CD on a disjoint shard with batch_size // world_size rows
+        per batch; the association statistics are all-reduced before every update,
+        so each step equals a single-process step on a batch of `batch_size` rows.
+        
+        Args:
+            dataset (Dataset): Training data (first element of each item is the input).
+            world_size (int): Number of worker processes.
+            batch_size (int): Global batch size, divisible by world_size.
+            seed (int): Seed for the sharding permutation (worker r also seeds torch with seed + r).
+            init_method (str, optional): torch.distributed rendezvous URL (a temp file if None).
+            num_threads (int, optional): Intra-op threads per worker. Defaults to an even
+                split of the current thread count.
+            **pretrain_kwargs: Forwarded to `pretrain` (epochs, lr, momentum, cache, ...).
+                They are pickled into the spawned workers, so callables such as
+                `lr_schedule` must be module-level functions rather than lambdas.
+            
+        Returns:
+            list of list of float: Reconstruction error history, as from `pretrain`.
+        """
+        if batch_size % world_size != 0:
+            raise ValueError("batch_size must be divisible by world_size.")
+        try:
+            pickle.dumps(pretrain_kwargs)
+        except Exception as e:
+            # Fail here with a clear message rather than inside mp.spawn
+            raise ValueError(f"pretrain_kwargs must be picklable for the worker processes "
+                             f"(use a module-level lr_schedule, not a lambda): {e}") from e
+        if num_threads is None:
+            num_threads = max(1, torch.get_num_threads() // world_size)
+        
+        # Workers receive the parameters in shared memory; rank 0 writes the result back
+        self.share_memory()
+        results = mp.get_context('spawn').SimpleQueue()
+        
+        with tempfile.TemporaryDirectory(prefix="dbn_dist_") as rendezvous:
+            if init_method is None:
+                init_method = "file://" + os.path.join(rendezvous, "store")
+            mp.spawn(_pretrain_worker, nprocs=world_size, join=True,
+                     args=(world_size, self, dataset, batch_size // world_size, seed, init_method,
+                           num_threads, results, pretrain_kwargs))
+        return results.get()
+
+    def finetune(self, train_loader, epochs=10, lr=1e-3, optimizer='adam', loss_fn=None,
+                 weight_decay=0.0, rbm_lr_scale=1.0, freeze_epochs=0):
+        """
+        Supervised fine-tuning of all RBM weights and the classifier by backpropagation.
+        
+        Schedules can be mixed: the first `freeze_epochs` epochs train only the
+        classifier on top of the pretrained features, after which the RBM layers
+        are unfrozen with their own learning rate `lr * rbm_lr_scale`.
+        
+        Args:
+            train_loader (DataLoader): Batches of (data, target).
+            epochs (int): Total number of epochs (including the frozen ones).
+            lr (float): Learning rate of the classifier.
+            optimizer (str): 'adam' or 'sgd' (with momentum 0.9).
+            loss_fn (callable, optional): Loss on (logits, target). Defaults to CrossEntropyLoss.
+            weight_decay (float): L2 penalty passed to the optimizer.
+            rbm_lr_scale (float): Learning rate of the RBM parameters relative to `lr`.
+            freeze_epochs (int): Leading epochs during which the RBM layers stay fixed.
+            
+        Returns:
+            list of float: Mean training loss per epoch.
+        """
+        if loss_fn is None:
+            loss_fn = nn.CrossEntropyLoss()
+        optimizers = {
+            'adam': lambda groups: torch.optim.Adam(groups, lr=lr, weight_decay=weight_decay),
+            'sgd': lambda groups: torch.optim.SGD(groups, lr=lr, momentum=0.9, weight_decay=weight_decay),
+        }
+        if optimizer not in optimizers:
+            raise ValueError(f"Unknown optimizer '{optimizer}' (expected 'adam' or 'sgd').")
+        
+        # One optimizer, two parameter groups. Frozen RBM parameters get no gradient,
+        # which the optimizer skips, so their state only starts once they are unfrozen.
+        opt = optimizers[optimizer]([
+            {'params': self.rbm_layers.parameters(), 'lr': lr * rbm_lr_scale},
+            {'params': self.classifier.parameters(), 'lr': lr},
+        ])
+        
+        history = []
+        self.train()
+        self.rbm_layers.requires_grad_(freeze_epochs <= 0)
+        try:
+            for epoch in range(epochs):
+                if epoch == freeze_epochs and freeze_epochs > 0:
+                    print(f"[INFO] Unfreezing RBM layers at epoch {epoch+1}")
+                    self.rbm_layers.requires_grad_(True)
                 
-                print(f"  Epoch {epoch+1}: Reconstruction Error = {total_error / len(train_loader):.4f}")
+                total_loss = 0.0
+                for data, target in train_loader:
+                    opt.zero_grad()
+                    loss = loss_fn(self(data), target)
+                    loss.backward()
+                    opt.step()
+                    total_loss += loss.item()
+                
+                history.append(total_loss / len(train_loader))
+                print(f"  Fine-tune Epoch {epoch+1}: Loss = {history[-1]:.4f}")
+        finally:
+            self.rbm_layers.requires_grad_(True)
+            self.eval()
+        
+        return history
+
+    def export_config(self, feature_names=None, selected_indices=None, input_mean=None, input_scale=None):
+        """
+        Architecture and input description stored alongside exported models.
+        
+        Args:
+            feature_names (list of str, optional): Name of each model input, in input order.
+            selected_indices (list of int, optional): Column of each input in the raw feature vector.
+            input_mean (list of float, optional): Training mean of each input (raw units).
+            input_scale (list of float, optional): Training standard deviation of each input;
+                serving computes (raw - input_mean) / input_scale before the forward pass.
+        """
+        input_dim = self.rbm_layers[0].visible_units
+        for values in (feature_names, selected_indices, input_mean, input_scale):
+            if values is not None and len(values) != input_dim:
+                raise ValueError(f"Expected {input_dim} feature names/indices/statistics, got {len(values)}.")
+        return {
+            'input_dim': input_dim,
+            'hidden_dims': list(self.hidden_dims),
+            'output_dim': self.classifier.out_features,
+            'visible_types': list(self.visible_types),
+            'feature_names': list(feature_names) if feature_names is not None else None,
+            'selected_indices': [int(i) for i in selected_indices] if selected_indices is not None else None,
+            'input_mean': [float(m) for m in input_mean] if input_mean is not None else None,
+            'input_scale': [float(s) for s in input_scale] if input_scale is not None else None,
+        }
+
+    def export(self, path, feature_names=None, selected_indices=None, format='torchscript',
+               input_mean=None, input_scale=None):
+        """
+        Write a self-describing inference artifact.
+        
+        'torchscript' traces and freezes the eval-mode forward pass and embeds the
+        `export_config` as the extra file 'config.json'; load it with `DBN.load_exported`.
+        'onnx' stores the same config as JSON under the 'config' metadata key
+        (requires the `onnx` package).
+        
+        Args:
+            path (str): Output file.
+            feature_names (list of str, optional): Input feature order (see `export_config`).
+            selected_indices (list of int, optional): Raw column of each input.
+            format (str): 'torchscript' or 'onnx'.
+            input_mean (list of float, optional): Training mean of each input (see `export_config`).
+            input_scale (list of float, optional): Training standard deviation of each input.
+        """
+        config = self.export_config(feature_names, selected_indices, input_mean, input_scale)
+        example = torch.zeros(1, config['input_dim'])
+        
+        was_training = self.training
+        self.eval()
+        try:
+            if format == 'torchscript':
+                with torch.no_grad():
+                    frozen = torch.jit.freeze(torch.jit.trace(self, example))
+                torch.jit.save(frozen, path, _extra_files={'config.json': json.dumps(config)})
+            elif format == 'onnx':
+                try:
+                    import onnx
+                except ImportError as e:
+                    raise ImportError("ONNX export requires the 'onnx' package.") from e
+                torch.onnx.export(self, example, path, input_names=['features'], output_names=['logits'],
+                                  dynamic_axes={'features': {0: 'batch'}, 'logits': {0: 'batch'}}, dynamo=False)
+                proto = onnx.load(path)
+                entry = proto.metadata_props.add()
+                entry.key, entry.value = 'config', json.dumps(config)
+                onnx.save(proto, path)
+            else:
+                raise ValueError(f"Unknown export format '{format}' (expected 'torchscript' or 'onnx').")
+        finally:
+            self.train(was_training)
+
+    @staticmethod
+    def load_exported(path, map_location='cpu'):
+        """
+        Load a TorchScript artifact written by `export`.
+        
+        Returns:
+            tuple: (ScriptModule, config dict). No DBN configuration needs to be known upfront.
+        """
+        extra_files = {'config.json': ''}
+        module = torch.jit.load(path, map_location=map_location, _extra_files=extra_files)
+        return module, json.loads(extra_files['config.json'])
+
+    def generate(self, n, gibbs_steps=100, batch_size=1024, seed=0):
+        """
+        Top-down generation: run a Gibbs chain in the top RBM, then propagate its
+        visible probabilities down through the lower RBMs.
+        
+        Samples are produced `batch_size` chains at a time and yielded chunk by chunk,
+        so memory stays bounded by one chunk regardless of `n`. The chains draw from a
+        private RNG stream seeded with `seed` (the global torch RNG is not touched), so
+        the output is reproducible for a given (seed, batch_size).
+        
+        Args:
+            n (int): Number of samples.
+            gibbs_steps (int): Alternating Gibbs steps in the top RBM.
+            batch_size (int): Chains run in parallel per chunk.
+            seed (int): Seed of the generation RNG.
+            
+        Yields:
+            Tensor: Chunk of shape (<= batch_size, input_dim) with visible probabilities
+            (Bernoulli input layer) or means (Gaussian input layer).
+        """
+        top = self.rbm_layers[-1]
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(seed)
+            rng_state = torch.get_rng_state()
+        
+        for start in range(0, n, batch_size):
+            rows = min(batch_size, n - start)
+            # Each chunk resumes the private stream; the caller's RNG is restored before yielding
+            with torch.no_grad(), torch.random.fork_rng(devices=[]):
+                torch.set_rng_state(rng_state)
+                
+                h = torch.bernoulli(torch.full((rows, top.hidden_units), 0.5))
+                for _ in range(gibbs_steps):
+                    _, h = top.sample_hidden(top._visible_state(h))
+                
+                # Down pass with probabilities (means for Gaussian units)
+                v, _ = top.sample_visible(h)
+                for rbm in reversed(self.rbm_layers[:-1]):
+                    v, _ = rbm.sample_visible(v)
+                
+                rng_state = torch.get_rng_state()
+            yield v
+
+    def inference_model(self, quantize=False):
+        """
+        Feed-forward copy of the trained network for serving.
+        
+        Each RBM becomes an nn.Linear (bias folded into one addmm) followed by an
+        in-place sigmoid. With quantize=True the Linear layers are dynamically
+        quantized to int8 (weights stored as int8, activations quantized per batch).
+        
+        Args:
+            quantize (bool): Apply dynamic int8 quantization.
+            
+        Returns:
+            InferenceDBN: Eval-mode module with the same forward semantics as this DBN.
+        """
+        model = InferenceDBN(self).eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        return model
 
     def forward(self, x):
         """
@@ -239,3 +913,72 @@ class DBN(nn.Module):
         # Pass through classifier
         output = self.classifier(x)
         return output
+
+class InferenceDBN(nn.Module):
+    """
+    Inference-only DBN: sigmoid(Linear) stack plus the classifier, built from a
+    trained `DBN` by `DBN.inference_model`. Parameters are copies, not shared.
+    """
+    def __init__(self, dbn):
+        super(InferenceDBN, self).__init__()
+        self.layers = nn.ModuleList()
+        for rbm in dbn.rbm_layers:
+            layer = nn.Linear(rbm.visible_units, rbm.hidden_units)
+            with torch.no_grad():
+                # nn.Linear stores (out, in); RBM.W is (visible, hidden)
+                layer.weight.copy_(rbm.W.t())
+                layer.bias.copy_(rbm.hidden_bias)
+            self.layers.append(layer)
+        self.classifier = copy.deepcopy(dbn.classifier)
+        self.requires_grad_(False)
+
+    def forward(self, x):
+        x = x.view(x.size(0), -1)
+        for layer in self.layers:
+            # addmm with the bias fused, then sigmoid in place on the fresh output
+            x = torch.sigmoid_(layer(x))
+        return self.classifier(x)
+
+def parity_report(reference, variants, data_loader):
+    """
+    Compare inference variants of a model against the float reference.
+    
+    Args:
+        reference (nn.Module): Float model (e.g. the trained DBN).
+        variants (dict): name -> model to compare.
+        data_loader (DataLoader): Batches of (data, target), e.g. the test split.
+        
+    Returns:
+        dict: name -> {'accuracy', 'agreement' (fraction of identical predictions),
+        'max_abs_diff' (largest logit difference), 'time' (seconds for the pass)};
+        the reference itself is reported under 'float'.
+    """
+    models = {'float': reference, **variants}
+    logits = {name: [] for name in models}
+    timings = dict.fromkeys(models, 0.0)
+    targets = []
+    
+    reference.eval()
+    with torch.no_grad():
+        for data, target in data_loader:
+            targets.append(target.view(-1))
+            for name, model in models.items():
+                start = time.perf_counter()
+                logits[name].append(model(data))
+                timings[name] += time.perf_counter() - start
+    
+    targets = torch.cat(targets)
+    ref_logits = torch.cat(logits['float'])
+    ref_pred = ref_logits.argmax(dim=1)
+    
+    report = {}
+    for name in models:
+        out = torch.cat(logits[name])
+        pred = out.argmax(dim=1)
+        report[name] = {
+            'accuracy': (pred == targets).float().mean().item(),
+            'agreement': (pred == ref_pred).float().mean().item(),
+            'max_abs_diff': (out - ref_logits).abs().max().item(),
+            'time': timings[name],
+        }
+    return report
@@ -1,5 +1,39 @@
 
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
 import numpy as np
+import scipy.sparse as sp
+
+# Version of the on-disk layout written by SparseFCM.save. Bump on incompatible changes.
+SCHEMA_VERSION = 1
+
+def _fit_restart(shm_name, shape, dtype, params, seed):
+    """
+    Run one SparseFCM restart in a worker process.
+    
+    X is attached read-only from shared memory instead of being pickled per task.
+    Only the small (C, D) / (D,) state travels back to the parent.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        X = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        X.flags.writeable = False
+        model = SparseFCM(**params)
+        start = time.perf_counter()
+        model._fit_single(X, seed)
+        elapsed = time.perf_counter() - start
+        del X # Release the buffer before closing the segment
+        return {
+            'v': model.v, 'w': model.w,
+            'sum_umx': model.sum_umx, 'sum_um': model.sum_um, 'dispersion': model.dispersion,
+            'objective': model.objective, 'n_iter': model.n_iter, 'time': elapsed,
+            'history': model.history,
+        }
+    finally:
+        shm.close()
 
 class SparseFCM:
     """
@@ -9,160 +43,538 @@ class SparseFCM:
     clustering and feature selection. Features with high intra-cluster variance
     (high dispersion) are down-weighted, and soft-thresholding is applied to
     encourage sparsity.
+    
+    X may be a dense array or a scipy.sparse matrix (e.g. one-hot clinical
+    features). Sparse input is never densified: distances and dispersion are
+    expanded as ||x||^2 - 2 x.v + ||v||^2 so the work scales with nnz.
     """
 
-    def __init__(self, n_clusters=2, m=2.0, epsilon=1e-5, max_iter=100, lambda_reg=0.1):
+    def __init__(self, n_clusters=2, m=2.0, epsilon=1e-5, max_iter=100, lambda_reg=0.1,
+                 chunk_size=None, membership='closed_form', random_state=42, decay=1.0,
+                 n_init=1, n_jobs=1, convergence='membership', warm_start=False):
         """
         Initialize SparseFCM hyperparameters.
         
         Args:
             n_clusters (int): Number of clusters (c).
             m (float): Fuzziness parameter (usually > 1).
-            epsilon (float): Convergence threshold.
+            epsilon (float): Convergence threshold (see `convergence`).
             max_iter (int): Maximum number of iterations.
             lambda_reg (float): Regularization parameter for soft-thresholding weights.
+            chunk_size (int, optional): Number of samples processed per block. When None,
+                all N samples form a single block (dense path). Setting it bounds the
+                temporary (chunk, C, D) tensors so peak memory no longer grows with N.
+            membership (str): Membership kernel, 'closed_form' (O(N*C), default) or
+                'pairwise' (original O(N*C^2) ratio formula).
+            random_state (int): Seed for the random membership initialization.
+            decay (float): Forgetting factor in (0, 1] applied to the running statistics
+                before each `partial_fit` batch. 1.0 keeps the full history; smaller
+                values let centers and feature weights track drift.
+            n_init (int): Number of independent restarts (seeds random_state, random_state+1, ...).
+                The run with the lowest weighted objective is kept.
+            n_jobs (int): Worker processes used for the restarts. 1 runs them in-process,
+                -1 uses all cores.
+            convergence (str): Stopping rule. 'membership' stops when ||U_new - U_old|| < epsilon;
+                'objective' stops when the relative change of the weighted objective
+                |J_prev - J| / J_prev < epsilon. Neither keeps a copy of U.
+            warm_start (bool): If True and the model is already fitted, `fit` starts from the
+                current memberships (or from the memberships under the current centers and
+                weights when X has a different number of rows) instead of a random init.
         """
         self.n_clusters = n_clusters
         self.m = m
         self.epsilon = epsilon
         self.max_iter = max_iter
         self.lambda_reg = lambda_reg
+        self.chunk_size = chunk_size
+        self.membership = membership
+        self.random_state = random_state
+        self.decay = decay
+        self.n_init = n_init
+        self.n_jobs = n_jobs
+        self.convergence = convergence
+        self.warm_start = warm_start
         
         # State
         self.u = None      # Membership matrix (N, n_clusters)
         self.v = None      # Cluster centers (n_clusters, D)
         self.w = None      # Feature weights (D,)
         self.trained = False
+        
+        # Running sufficient statistics (shared by fit and partial_fit)
+        self.sum_umx = None     # sum_i u_ij^m * x_i      (n_clusters, D)
+        self.sum_um = None      # sum_i u_ij^m            (n_clusters,)
+        self.dispersion = None  # R_k, see Step B         (D,)
+        self.n_samples_seen = 0
+        
+        # Standardization of the raw inputs, (x - input_mean) / input_scale. Optional:
+        # set by the pipeline and stored with the model so raw records can be scored.
+        self.input_mean = None  # (D,)
+        self.input_scale = None # (D,)
+        
+        # Fit diagnostics
+        self.objective = None   # J = sum_i sum_j u_ij^m * d_ij^2 of the kept run
+        self.n_iter = 0         # Iterations run by the kept run
+        self.restarts = []      # One record per restart: seed, objective, n_iter, time
+        self.history = []       # Per iteration of the kept run: objective, u_delta,
+                                # n_active_features, time (seconds)
+
+    def _params(self):
+        """
+        Constructor arguments of this estimator, e.g. to rebuild it in a worker.
+        """
+        return {
+            'n_clusters': self.n_clusters, 'm': self.m, 'epsilon': self.epsilon,
+            'max_iter': self.max_iter, 'lambda_reg': self.lambda_reg,
+            'chunk_size': self.chunk_size, 'membership': self.membership,
+            'random_state': self.random_state, 'decay': self.decay,
+            'convergence': self.convergence,
+        }
+
+    def _chunks(self, N, size=None):
+        """
+        Yield row slices covering range(N) in blocks of `size` (default `chunk_size`).
+        """
+        size = self.chunk_size if size is None else size
+        step = N if size is None else max(1, int(size))
+        for start in range(0, N, max(step, 1)):
+            yield slice(start, min(start + step, N))
+
+    @staticmethod
+    def _check_input(X):
+        """
+        Dense input -> np.ndarray (2-D); sparse input -> float CSR, never densified.
+        """
+        if sp.issparse(X):
+            X = X.tocsr()
+            if X.dtype.kind != 'f':
+                X = X.astype(np.float64)
+            return X
+        return np.atleast_2d(np.asarray(X))
+
+    @staticmethod
+    def _weighted_sum(um, X_block):
+        """
+        um.T @ X_block -> (C, D) dense, for dense or sparse X_block.
+        """
+        if sp.issparse(X_block):
+            return np.asarray((X_block.T @ um).T)
+        return um.T @ X_block
+
+    def _weighted_sq_dist(self, X_block):
+        """
+        Weighted squared Euclidean distance of each row to each center.
+        
+        Args:
+            X_block (np.ndarray or sparse): shape (n, D)
+            
+        Returns:
+            np.ndarray: d_sq of shape (n, C), d_ij^2 = sum_dim ( w_dim * (x_i - v_j)^2 )
+        """
+        if sp.issparse(X_block):
+            # sum_k w_k x_ik^2 - 2 sum_k w_k x_ik v_jk + sum_k w_k v_jk^2, O(nnz * C)
+            x_sq = np.asarray(X_block.multiply(X_block) @ self.w).reshape(-1, 1)   # (n, 1)
+            cross = np.asarray(X_block @ (self.v * self.w).T)                     # (n, C)
+            v_sq = ((self.v ** 2) @ self.w)[np.newaxis, :]                        # (1, C)
+            return np.maximum(x_sq - 2.0 * cross + v_sq, 0.0)
+        
+        # (n, 1, D) - (1, C, D) -> (n, C, D), bounded by the block size
+        diff = X_block[:, np.newaxis, :] - self.v[np.newaxis, :, :]
+        return ((diff ** 2) * self.w).sum(axis=2)
+
+    def _membership_pairwise(self, d_sq):
+        """
+        Original membership update through the (n, C, C) pairwise ratio tensor.
+        
+        Using squared distance D2: u_ik = 1 / sum_j ( (D2_ik / D2_ij) ^ (1/(m-1)) )
+        """
+        exponent = 1.0 / (self.m - 1)
+        
+        # (n, C, 1) / (n, 1, C) -> (n, C, C) pairwise ratios (d_ik / d_ij)
+        ratio = d_sq[:, :, np.newaxis] / d_sq[:, np.newaxis, :]
+        
+        ratio_power = ratio ** exponent
+        sum_ratios = ratio_power.sum(axis=2) # Sum over j -> (n, C)
+        
+        return 1.0 / sum_ratios
+
+    def _membership_closed_form(self, d_sq):
+        """
+        Membership update in normalized inverse-distance form, O(n*C).
+        
+        1 / sum_j (D2_ik / D2_ij)^e = D2_ik^-e / sum_j D2_ij^-e, with e = 1/(m-1).
+        Distances are first scaled by the row minimum so the powers stay in (0, 1]
+        and cannot overflow for m close to 1.
+        """
+        exponent = 1.0 / (self.m - 1)
+        
+        inv = (d_sq.min(axis=1, keepdims=True) / d_sq) ** exponent # (n, C)
+        return inv / inv.sum(axis=1, keepdims=True)
+
+    def _memberships(self, d_sq):
+        """
+        Dispatch to the configured membership kernel. d_sq: (n, C), already clipped.
+        """
+        if self.membership == 'pairwise':
+            return self._membership_pairwise(d_sq)
+        return self._membership_closed_form(d_sq)
+
+    def _dispersion_block(self, X_block, um):
+        """
+        Contribution of one block to R_k = sum_i sum_j (u_ij^m * (x_ik - v_jk)^2).
+        
+        Args:
+            X_block (np.ndarray): shape (n, D)
+            um (np.ndarray): u^m for the block, shape (n, C)
+            
+        Returns:
+            np.ndarray: shape (D,)
+        """
+        if sp.issparse(X_block):
+            # sum_j [ (u^m.T @ X^2)_jk - 2 v_jk (u^m.T @ X)_jk + v_jk^2 sum_i u_ij^m ]
+            umx_sq = self._weighted_sum(um, X_block.multiply(X_block).tocsr())   # (C, D)
+            umx = self._weighted_sum(um, X_block)                                # (C, D)
+            mass = um.sum(axis=0)[:, np.newaxis]                                 # (C, 1)
+            return np.maximum((umx_sq - 2.0 * self.v * umx + self.v ** 2 * mass).sum(axis=0), 0.0)
+        
+        # (n, C, D) = (n, 1, D) - (1, C, D)
+        diff = X_block[:, np.newaxis, :] - self.v[np.newaxis, :, :]
+        # Weighted sum over n and C
+        # (n, C, 1) * (n, C, D) -> (n, C, D) --sum--> (D,)
+        return (um[:, :, np.newaxis] * diff ** 2).sum(axis=(0, 1))
+
+    def _membership_matrix(self, X, batch_size=None):
+        """
+        Memberships (N, C) of X under the current centers and weights, block by block.
+        """
+        N = X.shape[0]
+        u = np.empty((N, self.n_clusters))
+        for rows in self._chunks(N, batch_size):
+            d_sq = np.maximum(self._weighted_sq_dist(X[rows]), 1e-10)
+            u[rows] = self._memberships(d_sq)
+        return u
+
+    def _update_weights(self, R):
+        """
+        Turn the per-feature dispersion R (D,) into normalized sparse weights.
+        """
+        # Inverse dispersion logic: 
+        # We want w_k to be high if R_k is low.
+        # Define raw importance p_k = 1 / (R_k + small_epsilon)
+        p = 1.0 / (R + 1e-10)
+        
+        # Soft-thresholding
+        # w_k = max(0, p_k - lambda)
+        w_unnormalized = np.maximum(0, p - self.lambda_reg)
+        
+        if w_unnormalized.sum() == 0:
+            # Fallback to uniform if all are thresholded to 0
+            return np.ones(R.shape[0]) / R.shape[0]
+        return w_unnormalized / w_unnormalized.sum()
 
     def fit(self, X):
         """
         Train the SparseFCM model on data X.
         
+        With n_init > 1, independent restarts are run (in a process pool when
+        n_jobs != 1) and the one with the lowest weighted objective is kept.
+        Per-restart results are recorded in `self.restarts`.
+        
+        Args:
+            X (np.ndarray or scipy.sparse matrix): Input data of shape (N, D).
+        """
+        X = self._check_input(X)
+        
+        if self.n_init <= 1 or self._can_warm_start(X):
+            start = time.perf_counter()
+            self._fit_single(X, self.random_state)
+            self.restarts = [{'seed': self.random_state, 'objective': self.objective,
+                              'n_iter': self.n_iter, 'time': time.perf_counter() - start}]
+        else:
+            self._fit_restarts(X)
+                
+        self.trained = True
+
+    def _fit_restarts(self, X):
+        """
+        Run `n_init` restarts and keep the state of the best one.
+        """
+        seeds = [self.random_state + r for r in range(self.n_init)]
+        n_jobs = os.cpu_count() if self.n_jobs == -1 else self.n_jobs
+        
+        # Shared memory holds one dense buffer; sparse restarts run in-process
+        if n_jobs is None or n_jobs <= 1 or sp.issparse(X):
+            results = []
+            best = None
+            for seed in seeds:
+                start = time.perf_counter()
+                self._fit_single(X, seed)
+                results.append({'objective': self.objective, 'n_iter': self.n_iter,
+                                'time': time.perf_counter() - start})
+                if best is None or self.objective < best['objective']:
+                    best = {'u': self.u, 'v': self.v, 'w': self.w,
+                            'sum_umx': self.sum_umx, 'sum_um': self.sum_um,
+                            'dispersion': self.dispersion, 'history': self.history,
+                            'objective': self.objective, 'n_iter': self.n_iter}
+        else:
+            # Share X once through shared memory; workers map it read-only
+            X = np.ascontiguousarray(X)
+            shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+            try:
+                np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[...] = X
+                params = self._params()
+                with ProcessPoolExecutor(max_workers=min(n_jobs, len(seeds))) as pool:
+                    futures = [pool.submit(_fit_restart, shm.name, X.shape, X.dtype.str, params, seed)
+                               for seed in seeds]
+                    results = [f.result() for f in futures]
+            finally:
+                shm.close()
+                shm.unlink()
+            
+            best = min(results, key=lambda r: r['objective'])
+            # The final U of a run is exactly the membership of X under its final V and W
+            self.v, self.w = best['v'], best['w']
+            best['u'] = self._membership_matrix(X)
+        
+        self.restarts = [{'seed': seed, 'objective': r['objective'], 'n_iter': r['n_iter'],
+                          'time': r['time']} for seed, r in zip(seeds, results)]
+        
+        self.u, self.v, self.w = best['u'], best['v'], best['w']
+        self.sum_umx, self.sum_um, self.dispersion = best['sum_umx'], best['sum_um'], best['dispersion']
+        self.objective, self.n_iter = best['objective'], best['n_iter']
+        self.history = best['history']
+        self.n_samples_seen = X.shape[0]
+
+    def _can_warm_start(self, X):
+        """
+        True if `fit` should continue from the current state instead of a random init.
+        """
+        return self.warm_start and self.trained and self.v is not None and \
+            self.v.shape == (self.n_clusters, X.shape[1])
+
+    def _fit_single(self, X, seed):
+        """
+        One SparseFCM run from a random initialization (or a warm start).
+        
+        Every step below walks X block by block (see `chunk_size`), so the
+        (N, C, D) difference tensor and the (N, C, C) ratio tensor are never
+        built for the whole dataset at once.
+        
         Args:
             X (np.ndarray): Input data of shape (N, D).
+            seed (int): Seed for the membership initialization.
         """
-        X = np.asarray(X)
         N, D = X.shape
         
-        # 1. Initialize U randomly, row-normalized
-        np.random.seed(42) # For reproducibility
-        self.u = np.random.rand(N, self.n_clusters)
-        self.u = self.u / self.u.sum(axis=1, keepdims=True)
+        if self._can_warm_start(X):
+            # Warm start: keep U (W and V are recomputed from it in Steps A/B)
+            if self.u is None or self.u.shape != (N, self.n_clusters):
+                self.u = self._membership_matrix(X)
+        else:
+            # 1. Initialize U randomly, row-normalized
+            rng = np.random.RandomState(seed) # For reproducibility
+            self.u = rng.rand(N, self.n_clusters)
+            self.u = self.u / self.u.sum(axis=1, keepdims=True)
+            
+            # 2. Initialize W uniformly
+            self.w = np.ones(D) / D
+            
+            self.v = np.zeros((self.n_clusters, D))
         
-        # 2. Initialize W uniformly
-        self.w = np.ones(D) / D
+        self.history = []
+        prev_objective = None
         
-        self.v = np.zeros((self.n_clusters, D))
+        # Defined up front so max_iter=0 leaves the initial state (random U, uniform W)
+        # with empty statistics instead of failing after the loop
+        numerator = np.zeros((self.n_clusters, D))
+        denominator = np.zeros(self.n_clusters)
+        R = np.zeros(D)
+        objective = np.inf
+        iteration = -1
         
         for iteration in range(self.max_iter):
-            u_old = self.u.copy()
+            iter_start = time.perf_counter()
             
             # --- Step A: Update Centers (V) ---
             # v_j = (sum(u_ij^m * x_i)) / (sum(u_ij^m))
             # Shape: (C, D)
-            um = self.u ** self.m  # (N, C)
-            
-            # Numerator: (C, N) @ (N, D) -> (C, D)
-            # Denominator: (C, 1) through summation
-            numerator = um.T @ X
-            denominator = um.sum(axis=0, keepdims=True).T + 1e-10 # Avoid div-by-zero
+            # Numerator: (C, n) @ (n, D) -> (C, D), accumulated over blocks
+            # Denominator: (C,) through summation
+            numerator = np.zeros((self.n_clusters, D))
+            denominator = np.zeros(self.n_clusters)
+            for rows in self._chunks(N):
+                um = self.u[rows] ** self.m  # (n, C)
+                numerator += self._weighted_sum(um, X[rows])
+                denominator += um.sum(axis=0)
             
-            self.v = numerator / denominator
+            self.v = numerator / (denominator[:, np.newaxis] + 1e-10) # Avoid div-by-zero
             
             # --- Step B: Update Weights (W) ---
             # Only used for logic that requires feature weighting. 
             # Calculate Dispersion R_k for each feature k.
             # R_k = sum_i sum_j (u_ij^m * (x_ik - v_jk)^2)
+            R = np.zeros(D)
+            for rows in self._chunks(N):
+                R += self._dispersion_block(X[rows], self.u[rows] ** self.m)
             
-            # (N, C, D) = (N, 1, D) - (1, C, D)
-            diff = X[:, np.newaxis, :] - self.v[np.newaxis, :, :] 
-            dist_sq = diff ** 2 # (N, C, D)
-            
-            # Weighted sum over N and C
-            # (N, C, 1) * (N, C, D) -> (N, C, D) --sum--> (D,)
-            R = (um[:, :, np.newaxis] * dist_sq).sum(axis=(0, 1))
-            
-            # Inverse dispersion logic: 
-            # We want w_k to be high if R_k is low.
-            # Define raw importance p_k = 1 / (R_k + small_epsilon)
-            p = 1.0 / (R + 1e-10)
-            
-            # Soft-thresholding
-            # w_k = max(0, p_k - lambda)
-            w_unnormalized = np.maximum(0, p - self.lambda_reg)
-            
-            if w_unnormalized.sum() == 0:
-                # Fallback to uniform if all are thresholded to 0
-                self.w = np.ones(D) / D
-            else:
-                self.w = w_unnormalized / w_unnormalized.sum()
+            self.w = self._update_weights(R)
                 
             # --- Step C: Update Membership (U) ---
             # u_ij = 1 / sum_k ( (d_ij / d_ik)^(2/(m-1)) )
             # d_ij^2 = sum_dim ( w_dim * (x - v)^2 )
-            
-            # Re-calculate distances with new V and new W
-            # dist_sq (N, C, D) already computed, but V changed? 
-            # Actually, standard FCM iterates steps. V was updated in Step A.
-            # So we use the new V to compute distances.
+            # Evaluated by `_memberships` (closed form by default, see `membership`).
             
             # Note: We should technically update V using new W? 
-            # Standard FCM updates V independent of W if metric is Euclidean, 
-            # but for weighted distance, V update technically depends on W if W is matrix? 
             # If W is diagonal (vector), V formula remains standard weighted average 
-            # because W factors out in the derivative dJ/dV = 0?
-            # Yes, d/dv ( w * (x-v)^2 ) = 2w(x-v). 
+            # because W factors out in the derivative dJ/dV = 0:
+            # d/dv ( w * (x-v)^2 ) = 2w(x-v). 
             # sum u^m * w * (x-v) = 0 => v = sum(u^m w x) / sum(u^m w).
             # If w is constant for all clusters, it cancels out! 
             # So V update formula is correct as is.
             
-            # Recalculate diff with NEW V (updated in Step A)
-            diff = X[:, np.newaxis, :] - self.v[np.newaxis, :, :]
-            dist_sq_component = diff ** 2  # (N, C, D)
-            
-            # Weighted Squared Euclidean Distance
-            # Sum over D: (N, C, D) * (D,) -> (N, C)
-            d_sq = (dist_sq_component * self.w).sum(axis=2)
-            
-            # Avoid zero distances (implies point is exactly at center)
-            d_sq = np.maximum(d_sq, 1e-10)
-            
-            # Formula: u_ik = ( sum_j (d_ik^2 / d_ij^2) ^ (1/(m-1)) ) ^ -1
-            #        = ( d_ik^2 ^ (1/(m-1)) * sum_j (1 / d_ij^2)^(1/(m-1)) ) ^ -1 ? NO.
-            
-            # Simpler: u_ik = 1 / sum_j ( (d_ik / d_ij) ^ (2/(m-1)) )
-            # Let power p = 2 / (m - 1) implies distance, not squared distance in base.
-            # Using squared distance D2: u_ik = 1 / sum_j ( (D2_ik / D2_ij) ^ (1/(m-1)) )
-            
-            exponent = 1.0 / (self.m - 1)
-            
-            # (N, C, 1) / (N, 1, C) -> (N, C, C) pairwise ratios for the sum?
-            # Or just broadcast: 
-            # d_sq shape (N, C).
-            # We need for each i, k: sum_j (d_sq[i,k] / d_sq[i,j]) ** exponent
-            
-            # Expand d_sq to (N, C, 1) and (N, 1, C)
-            # (d_ik / d_ij)
-            ratio = d_sq[:, :, np.newaxis] / d_sq[:, np.newaxis, :] # (N, C, C)
+            # Squared membership change, accumulated per block instead of
+            # keeping a full copy of the previous U around.
+            u_diff_sq = 0.0
+            # Weighted objective J = sum_i sum_j u_ij^m * d_ij^2
+            objective = 0.0
+            for rows in self._chunks(N):
+                # Distances with NEW V (Step A) and NEW W (Step B)
+                d_sq = self._weighted_sq_dist(X[rows])
+                
+                # Avoid zero distances (implies point is exactly at center)
+                d_sq = np.maximum(d_sq, 1e-10)
+                
+                u_block = self._memberships(d_sq)
+                u_diff_sq += ((u_block - self.u[rows]) ** 2).sum()
+                objective += ((u_block ** self.m) * d_sq).sum()
+                self.u[rows] = u_block
             
-            ratio_power = ratio ** exponent
-            sum_ratios = ratio_power.sum(axis=2) # Sum over j -> (N, C)
+            # --- Check Convergence ---
+            # Same value as np.linalg.norm(u_new - u_old)
+            u_diff = np.sqrt(u_diff_sq)
             
-            self.u = 1.0 / sum_ratios
+            self.history.append({
+                'objective': float(objective),
+                'u_delta': float(u_diff),
+                'n_active_features': int(np.count_nonzero(self.w)),
+                'time': time.perf_counter() - iter_start,
+            })
             
-            # --- Check Convergence ---
-            u_diff = np.linalg.norm(self.u - u_old)
-            if u_diff < self.epsilon:
+            if self.convergence == 'objective':
+                if prev_objective is not None and \
+                        abs(prev_objective - objective) < self.epsilon * max(abs(prev_objective), 1e-12):
+                    break
+                prev_objective = objective
+            elif u_diff < self.epsilon:
                 break
-                
+        
+        self.objective = float(objective)
+        self.n_iter = iteration + 1
+        
+        # Keep the last iteration's statistics so partial_fit can continue from here
+        self.sum_umx = numerator
+        self.sum_um = denominator
+        self.dispersion = R
+        self.n_samples_seen = N
+
+    def partial_fit(self, X_batch):
+        """
+        Update centers and feature weights from one mini-batch (online SparseFCM).
+        
+        Memberships of the batch are computed against the current centers, then
+        the running statistics are decayed and the batch contribution added:
+            sum_umx <- decay * sum_umx + sum_i u_ij^m x_i
+            sum_um  <- decay * sum_um  + sum_i u_ij^m
+            R       <- decay * R       + batch dispersion around the new centers
+        Cost per call depends only on the batch size, never on the stream length.
+        On a fresh model the first batch is fitted in full; after `fit` the
+        stream continues from the fitted statistics.
+        
+        Note: R is a sum over the (decayed) samples seen, as in `fit`, so
+        `lambda_reg` acts on an effective window of about batch / (1 - decay)
+        samples. Use decay < 1 on long streams.
+        
+        Args:
+            X_batch (np.ndarray or scipy.sparse matrix): Batch of shape (n, D).
+        """
+        X = self._check_input(X_batch)
+        n, D = X.shape
+        
+        if self.v is None:
+            # First batch: a regular batch fit seeds centers, weights and statistics.
+            # A single online step from random memberships would leave every center
+            # at the batch mean.
+            self.fit(X)
+            return
+        
+        u = self._membership_matrix(X)
+        um = u ** self.m
+        
+        if self.sum_umx is None or self.sum_um is None or self.dispersion is None:
+            self._rebuild_statistics(X, um)
+        
+        # Centers from decayed weighted sums and membership mass
+        self.sum_umx = self.decay * self.sum_umx + self._weighted_sum(um, X)
+        self.sum_um = self.decay * self.sum_um + um.sum(axis=0)
+        self.v = self.sum_umx / (self.sum_um[:, np.newaxis] + 1e-10)
+        
+        # Feature weights from decayed dispersion
+        R = np.zeros(D)
+        for rows in self._chunks(n):
+            R += self._dispersion_block(X[rows], um[rows])
+        self.dispersion = self.decay * self.dispersion + R
+        self.w = self._update_weights(self.dispersion)
+        
+        self.u = u # Memberships of the last batch
+        self.n_samples_seen += n
         self.trained = True
 
-    def predict(self, X):
+    def _rebuild_statistics(self, X, um):
+        """
+        Recreate missing running statistics (e.g. a model saved without them) from
+        the fitted centers, so partial_fit can continue instead of failing.
+        
+        The membership mass is the batch's cluster proportions scaled to
+        `n_samples_seen`, sum_umx = mass * v reproduces the current centers exactly,
+        and the dispersion is the batch dispersion around those centers scaled to
+        the same mass.
+        
+        Args:
+            X (np.ndarray or scipy.sparse matrix): Current batch (n, D).
+            um (np.ndarray): Its memberships to the power m (n, C).
+        """
+        n = X.shape[0]
+        scale = max(self.n_samples_seen, n) / n
+        self.sum_um = um.sum(axis=0) * scale
+        self.sum_umx = self.sum_um[:, np.newaxis] * self.v
+        
+        R = np.zeros(X.shape[1])
+        for rows in self._chunks(n):
+            R += self._dispersion_block(X[rows], um[rows])
+        self.dispersion = R * scale
+
+    def scale_input(self, X):
+        """
+        Standardize raw inputs with the stored `input_mean` / `input_scale`.
+        
+        Args:
+            X (array-like): Raw feature rows of shape (N, D).
+            
+        Returns:
+            np.ndarray: (X - input_mean) / input_scale.
+        """
+        if self.input_mean is None or self.input_scale is None:
+            raise RuntimeError("No input scaling stored with this model.")
+        return (np.atleast_2d(np.asarray(X, dtype=float)) - self.input_mean) / self.input_scale
+
+    def predict(self, X, batch_size=None):
         """
         Predict cluster membership for new data X.
         
         Args:
-            X (np.ndarray): shape (N, D)
+            X (np.ndarray or scipy.sparse matrix): shape (N, D), or a single row of shape (D,)
+            batch_size (int, optional): Rows scored per vectorized block
+                (defaults to `chunk_size`, i.e. all rows at once).
             
         Returns:
             np.ndarray: Predicted cluster indices shape (N,)
@@ -170,21 +582,152 @@ class SparseFCM:
         if not self.trained:
             raise RuntimeError("Model needed to be trained before prediction.")
             
-        X = np.asarray(X)
+        X = self._check_input(X)
         N, D = X.shape
         
-        # Calculate Weighted Distances to Centers
-        # (N, 1, D) - (1, C, D)
-        diff = X[:, np.newaxis, :] - self.v[np.newaxis, :, :]
-        dist_sq_component = diff ** 2
-        d_sq = (dist_sq_component * self.w).sum(axis=2)
+        # Weighted distances to centers, block by block
+        labels = np.empty(N, dtype=np.int64)
+        for rows in self._chunks(N, batch_size):
+            labels[rows] = np.argmin(self._weighted_sq_dist(X[rows]), axis=1)
+        
+        return labels
+
+    def predict_proba(self, X, batch_size=None):
+        """
+        Fuzzy cluster memberships for new data X.
+        
+        Args:
+            X (np.ndarray or scipy.sparse matrix): shape (N, D), or a single row of shape (D,)
+            batch_size (int, optional): Rows scored per vectorized block
+                (defaults to `chunk_size`, i.e. all rows at once).
+            
+        Returns:
+            np.ndarray: Membership matrix shape (N, C), rows sum to 1.
+        """
+        if not self.trained:
+            raise RuntimeError("Model needed to be trained before prediction.")
+            
+        return self._membership_matrix(self._check_input(X), batch_size)
+
+    def save(self, path):
+        """
+        Save the fitted model to an uncompressed .npz archive.
+        
+        Stores centers, weights, running statistics, the optional input scaling and
+        hyperparameters together with SCHEMA_VERSION. The training memberships U are
+        not stored. Arrays are plain (no pickle), so loading is a direct read.
+        
+        Args:
+            path (str): Target file (conventionally ending in .npz).
+        """
+        if not self.trained:
+            raise RuntimeError("Model needed to be trained before saving.")
+        
+        arrays = {
+            'schema_version': np.array(SCHEMA_VERSION),
+            'v': self.v,
+            'w': self.w,
+            'n_samples_seen': np.array(self.n_samples_seen),
+        }
+        for name in ('sum_umx', 'sum_um', 'dispersion', 'input_mean', 'input_scale'):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        for name, value in self._params().items():
+            # None (e.g. chunk_size) is stored as an empty array
+            arrays['param_' + name] = np.array([] if value is None else value)
         
-        return np.argmin(d_sq, axis=1)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
 
-    def get_selected_features(self, threshold=0.01):
+    @classmethod
+    def load(cls, path):
+        """
+        Load a model written by `save`, ready for predict/predict_proba/partial_fit.
+        
+        Args:
+            path (str): Path to the .npz archive.
+            
+        Returns:
+            SparseFCM: The restored model.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data['schema_version'])
+            if version != SCHEMA_VERSION:
+                raise ValueError(f"Unsupported SparseFCM schema version {version} "
+                                 f"(expected {SCHEMA_VERSION}).")
+            
+            params = {}
+            for key in data.files:
+                if key.startswith('param_'):
+                    value = data[key]
+                    params[key[len('param_'):]] = None if value.size == 0 else value.item()
+            
+            model = cls(**params)
+            model.v = data['v']
+            model.w = data['w']
+            model.n_samples_seen = int(data['n_samples_seen'])
+            for name in ('sum_umx', 'sum_um', 'dispersion', 'input_mean', 'input_scale'):
+                if name in data.files:
+                    setattr(model, name, data[name])
+        
+        model.trained = True
+        return model
+
+    def fit_path(self, X, lambdas, threshold=0.01, k=None):
+        """
+        Regularization path: fit once per `lambda_reg` value, warm-starting each fit
+        from the previous centers and memberships.
+        
+        Consecutive lambdas give nearby solutions, so after the first (cold) fit each
+        step typically needs only a few iterations. Sweep lambdas in increasing order
+        to move from dense to sparse weights. The model is left fitted at the last lambda.
+        
+        Args:
+            X (np.ndarray or scipy.sparse matrix): Input data of shape (N, D).
+            lambdas (iterable of float): lambda_reg values, in sweep order.
+            threshold (float): Weight threshold used for the recorded selection.
+            k (int, optional): Feature budget used for the recorded selection instead.
+            
+        Returns:
+            list of dict: One entry per lambda with 'lambda_reg', 'selected', 'weights',
+            'n_iter', 'objective' and 'collapsed'. 'collapsed' is True when lambda
+            thresholded every weight to zero and `_update_weights` fell back to uniform
+            weights; no feature survived, so 'selected' is empty for that entry.
+        """
+        X = self._check_input(X)
+        warm_start = self.warm_start
+        path = []
+        try:
+            for step, lam in enumerate(lambdas):
+                self.lambda_reg = lam
+                # The first step honours the caller's warm_start; later steps always warm-start
+                self.warm_start = warm_start or step > 0
+                self.fit(X)
+                # Same soft-threshold as _update_weights on the final dispersion
+                collapsed = not np.any(1.0 / (self.dispersion + 1e-10) > lam)
+                path.append({
+                    'lambda_reg': lam,
+                    'selected': (np.array([], dtype=int) if collapsed
+                                 else self.get_selected_features(threshold=threshold, k=k)),
+                    'weights': self.w.copy(),
+                    'n_iter': self.n_iter,
+                    'objective': self.objective,
+                    'collapsed': collapsed,
+                })
+        finally:
+            self.warm_start = warm_start
+        return path
+
+    def get_selected_features(self, threshold=0.01, k=None):
         """
         Return indices of features with weights > threshold.
+        
+        If k is given, return the (at most) k features with the largest non-zero
+        weights instead, in ascending index order.
         """
         if self.w is None:
             return []
+        if k is not None:
+            top = np.argsort(-self.w, kind='stable')[:k]
+            return np.sort(top[self.w[top] > 0])
         return np.where(self.w > threshold)[0]
@@ -0,0 +1,303 @@
+
+import time
+
+import torch
+
+from .sparse_fcm import SparseFCM
+
+class TorchSparseFCM:
+    """
+    Torch-native Sparse Fuzzy C-Means.
+
+    Same algorithm and API as `SparseFCM` (fit / predict / predict_proba /
+    get_selected_features, attributes u, v, w), but it runs on torch tensors so
+    feature selection and DBN training share one tensor runtime.
+
+    All per-iteration work goes into buffers allocated once in `fit`, and
+    distances use the expansion
+        d_ij^2 = sum_k w_k x_ik^2 - 2 sum_k w_k x_ik v_jk + sum_k w_k v_jk^2
+    so the (N, C, D) difference tensor is never built.
+    """
+
+    def __init__(self, n_clusters=2, m=2.0, epsilon=1e-5, max_iter=100, lambda_reg=0.1,
+                 random_state=42, dtype=torch.float32, device='cpu', num_threads=None,
+                 convergence='membership'):
+        """
+        Initialize TorchSparseFCM hyperparameters.
+
+        Args:
+            n_clusters (int): Number of clusters (c).
+            m (float): Fuzziness parameter (usually > 1).
+            epsilon (float): Convergence threshold (see `convergence`).
+            max_iter (int): Maximum number of iterations.
+            lambda_reg (float): Regularization parameter for soft-thresholding weights.
+            random_state (int): Seed for the random membership initialization.
+            dtype (torch.dtype): torch.float32 or torch.float64. With float32 the
+                membership delta has a noise floor around sqrt(N * C) * 1e-7, so keep
+                epsilon above that on large inputs.
+            device (str): Device to run on.
+            num_threads (int, optional): Intra-op CPU threads used during fit/predict.
+                None leaves torch's current setting untouched.
+            convergence (str): 'membership' (||U_new - U_old|| < epsilon) or 'objective'
+                (relative objective change < epsilon), as in `SparseFCM`.
+        """
+        self.n_clusters = n_clusters
+        self.m = m
+        self.epsilon = epsilon
+        self.max_iter = max_iter
+        self.lambda_reg = lambda_reg
+        self.random_state = random_state
+        self.dtype = dtype
+        self.device = device
+        self.num_threads = num_threads
+        self.convergence = convergence
+
+        # State
+        self.u = None      # Membership matrix (N, n_clusters)
+        self.v = None      # Cluster centers (n_clusters, D)
+        self.w = None      # Feature weights (D,)
+        self.trained = False
+
+        # Sufficient statistics of the last iteration (exported by to_numpy for partial_fit)
+        self.sum_umx = None     # sum_i u_ij^m * x_i      (n_clusters, D)
+        self.sum_um = None      # sum_i u_ij^m            (n_clusters,)
+        self.dispersion = None  # R_k                     (D,)
+
+        # Fit diagnostics
+        self.objective = None
+        self.n_iter = 0
+        self.history = []   # Per iteration: objective, u_delta, n_active_features, time
+
+    def _as_tensor(self, X):
+        """
+        Move X to the configured device/dtype (no copy if it already matches).
+        """
+        return torch.as_tensor(X).to(device=self.device, dtype=self.dtype)
+
+    def _weighted_sq_dist(self, X, X_sq, out):
+        """
+        Weighted squared distances (N, C) written into `out`.
+
+        Args:
+            X (Tensor): (N, D)
+            X_sq (Tensor): X ** 2, (N, D)
+            out (Tensor): (N, C) buffer
+        """
+        # -2 * X @ (w * v).T + (X^2 @ w)[:, None] + (v^2 @ w)[None, :]
+        torch.matmul(X, (self.v * self.w).t(), out=out)
+        out.mul_(-2.0)
+        out.add_(torch.mv(X_sq, self.w).unsqueeze(1))
+        out.add_(torch.mv(self.v * self.v, self.w).unsqueeze(0))
+        # Expansion can go slightly negative by cancellation; also avoids zero distances
+        return out.clamp_(min=1e-10)
+
+    def _memberships(self, d_sq, out):
+        """
+        Closed-form membership update into `out`:
+        u_ik = D2_ik^-e / sum_j D2_ij^-e, with e = 1/(m-1), scaled by the row minimum.
+        """
+        exponent = 1.0 / (self.m - 1)
+        torch.div(d_sq.min(dim=1, keepdim=True).values, d_sq, out=out)
+        out.pow_(exponent)
+        return out.div_(out.sum(dim=1, keepdim=True))
+
+    def _update_weights(self, R):
+        """
+        Turn the per-feature dispersion R (D,) into normalized sparse weights.
+        """
+        # Inverse dispersion p_k = 1 / (R_k + eps), then soft-thresholding max(0, p_k - lambda)
+        w_unnormalized = torch.clamp(1.0 / (R + 1e-10) - self.lambda_reg, min=0.0)
+        total = w_unnormalized.sum()
+
+        if total.item() == 0:
+            # Fallback to uniform if all are thresholded to 0
+            return torch.full_like(R, 1.0 / R.numel())
+        return w_unnormalized.div_(total)
+
+    def _run(self, fn, *args):
+        """
+        Call fn with the configured intra-op thread count, restoring it afterwards.
+        """
+        if self.num_threads is None:
+            return fn(*args)
+        previous = torch.get_num_threads()
+        torch.set_num_threads(self.num_threads)
+        try:
+            return fn(*args)
+        finally:
+            torch.set_num_threads(previous)
+
+    def fit(self, X):
+        """
+        Train the model on data X.
+
+        Args:
+            X (Tensor or array-like): Input data of shape (N, D).
+        """
+        with torch.no_grad():
+            self._run(self._fit, self._as_tensor(X))
+        self.trained = True
+
+    def _fit(self, X):
+        N, D = X.shape
+        C = self.n_clusters
+        kw = {'device': self.device, 'dtype': self.dtype}
+
+        # 1. Initialize U randomly, row-normalized
+        gen = torch.Generator(device=self.device).manual_seed(self.random_state)
+        u = torch.rand(N, C, generator=gen, **kw)
+        u.div_(u.sum(dim=1, keepdim=True))
+
+        # 2. Initialize W uniformly (and V at zero, as in SparseFCM)
+        self.w = torch.full((D,), 1.0 / D, **kw)
+        self.v = torch.zeros(C, D, **kw)
+
+        # Buffers reused across iterations
+        X_sq = X * X                       # (N, D)
+        um = torch.empty(N, C, **kw)       # u^m
+        d_sq = torch.empty(N, C, **kw)     # weighted squared distances
+        u_next = torch.empty(N, C, **kw)   # next memberships (swapped with u)
+        numerator = torch.empty(C, D, **kw)
+        umx_sq = torch.empty(C, D, **kw)
+
+        torch.pow(u, self.m, out=um)
+
+        self.history = []
+        prev_objective = None
+
+        # Defined up front so max_iter=0 leaves the initial state
+        numerator.zero_()
+        mass = torch.zeros(C, **kw)
+        R = torch.zeros(D, **kw)
+        objective = float('inf')
+        iteration = -1
+
+        for iteration in range(self.max_iter):
+            iter_start = time.perf_counter()
+
+            # --- Step A: Update Centers (V) ---
+            # v_j = sum_i(u_ij^m * x_i) / sum_i(u_ij^m)
+            torch.matmul(um.t(), X, out=numerator)
+            mass = um.sum(dim=0)           # (C,)
+            self.v = numerator / (mass.unsqueeze(1) + 1e-10)
+
+            # --- Step B: Update Weights (W) ---
+            # R_k = sum_j [ (u^m.T @ X^2)_jk - 2 v_jk (u^m.T @ X)_jk + v_jk^2 sum_i u_ij^m ]
+            torch.matmul(um.t(), X_sq, out=umx_sq)
+            umx_sq.addcmul_(self.v, numerator, value=-2.0)
+            umx_sq.addcmul_(self.v * self.v, mass.unsqueeze(1))
+            R = umx_sq.sum(dim=0).clamp_(min=0.0)
+
+            self.w = self._update_weights(R)
+
+            # --- Step C: Update Membership (U) ---
+            self._weighted_sq_dist(X, X_sq, out=d_sq)
+            self._memberships(d_sq, out=u_next)
+
+            # --- Check Convergence ---
+            # ||u_next - u|| computed in the old buffer, which is then reused
+            u_diff = u.sub_(u_next).norm().item()
+            u, u_next = u_next, u
+
+            torch.pow(u, self.m, out=um)
+            objective = torch.dot(um.view(-1), d_sq.view(-1)).item()
+
+            self.history.append({
+                'objective': objective,
+                'u_delta': u_diff,
+                'n_active_features': int(torch.count_nonzero(self.w).item()),
+                'time': time.perf_counter() - iter_start,
+            })
+
+            if self.convergence == 'objective':
+                if prev_objective is not None and \
+                        abs(prev_objective - objective) < self.epsilon * max(abs(prev_objective), 1e-12):
+                    break
+                prev_objective = objective
+            elif u_diff < self.epsilon:
+                break
+
+        self.u = u
+        self.objective = objective
+        self.n_iter = iteration + 1
+
+        # Statistics of the last Step A/B, as kept by SparseFCM._fit_single
+        self.sum_umx = numerator.clone() # numerator is a reused buffer
+        self.sum_um = mass
+        self.dispersion = R
+
+    def predict_proba(self, X):
+        """
+        Fuzzy cluster memberships for new data X.
+
+        Args:
+            X (Tensor): shape (N, D)
+
+        Returns:
+            Tensor: Membership matrix shape (N, C), rows sum to 1.
+        """
+        if not self.trained:
+            raise RuntimeError("Model needed to be trained before prediction.")
+
+        X = self._as_tensor(X)
+
+        def _proba():
+            d_sq = torch.empty(X.shape[0], self.n_clusters, device=self.device, dtype=self.dtype)
+            self._weighted_sq_dist(X, X * X, out=d_sq)
+            return self._memberships(d_sq, out=torch.empty_like(d_sq))
+
+        with torch.no_grad():
+            return self._run(_proba)
+
+    def predict(self, X):
+        """
+        Predict cluster membership for new data X.
+
+        Args:
+            X (Tensor): shape (N, D)
+
+        Returns:
+            Tensor: Predicted cluster indices shape (N,)
+        """
+        return torch.argmax(self.predict_proba(X), dim=1)
+
+    def to_numpy(self):
+        """
+        Copy the fitted state into a NumPy `SparseFCM` (e.g. for `save` or serving).
+        """
+        model = SparseFCM(n_clusters=self.n_clusters, m=self.m, epsilon=self.epsilon,
+                          max_iter=self.max_iter, lambda_reg=self.lambda_reg,
+                          random_state=self.random_state, convergence=self.convergence)
+        if self.trained:
+            model.u = self.u.detach().cpu().double().numpy()
+            model.v = self.v.detach().cpu().double().numpy()
+            model.w = self.w.detach().cpu().double().numpy()
+            model.sum_umx = self.sum_umx.detach().cpu().double().numpy()
+            model.sum_um = self.sum_um.detach().cpu().double().numpy()
+            model.dispersion = self.dispersion.detach().cpu().double().numpy()
+            model.objective, model.n_iter = self.objective, self.n_iter
+            model.history = list(self.history)
+            model.n_samples_seen = self.u.shape[0]
+            model.trained = True
+        return model
+
+    def save(self, path):
+        """
+        Save the fitted model in the `SparseFCM.save` .npz format.
+        """
+        self.to_numpy().save(path)
+
+    def get_selected_features(self, threshold=0.01, k=None):
+        """
+        Return indices (LongTensor) of features with weights > threshold.
+
+        If k is given, return the (at most) k features with the largest non-zero
+        weights instead, in ascending index order. Ties go to the lower index, as
+        in `SparseFCM.get_selected_features`.
+        """
+        if self.w is None:
+            return torch.empty(0, dtype=torch.long)
+        if k is not None:
+            top = torch.argsort(-self.w, stable=True)[:k]
+            return torch.sort(top[self.w[top] > 0]).values
+        return torch.nonzero(self.w > threshold).flatten()
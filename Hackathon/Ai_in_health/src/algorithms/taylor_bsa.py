@@ -1,16 +1,44 @@
 
+import os
+import hashlib
+import tempfile
 import torch
 import torch.nn as nn
+import torch.multiprocessing as mp
+from torch.func import functional_call, vmap
 from torch.nn.utils import parameters_to_vector, vector_to_parameters
 import numpy as np
 
+# Per-process state of a fitness worker (set once by the pool initializer)
+_worker_state = {}
+
+def _init_fitness_worker(optimizer, data_loader, loss_fn, num_threads):
+    """
+    Pool initializer: keep a private optimizer replica (own model copy, population
+    tensor in shared memory) plus the data, so tasks only carry bird indices.
+    """
+    torch.set_num_threads(num_threads)
+    optimizer.n_workers = 1 # Workers evaluate their chunk in-process
+    _worker_state.update(optimizer=optimizer, data_loader=data_loader, loss_fn=loss_fn)
+
+def _worker_fitness(indices, seed):
+    """
+    Fitness of the birds `indices`, read from the shared population.
+    """
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    state = _worker_state
+    return state['optimizer']._population_fitness(state['data_loader'], state['loss_fn'], indices).tolist()
+
 class TaylorBSAOptimizer:
     """
     Taylor-Bird Swarm Algorithm (Taylor-BSA) Optimizer.
     Uses a Taylor series expansion for position updates to enhance exploration/exploitation.
     """
     def __init__(self, model, population_size=20, prob_foraging=0.8, prob_flight=0.1, 
-                 low=-1.0, high=1.0, device='cpu'):
+                 low=-1.0, high=1.0, device='cpu', noise_range=0.5, keep_initial=False,
+                 vectorize=True, n_workers=1, seed=0, fitness_mode='full', halving_eta=2,
+                 min_batches=1, checkpoint_path=None, checkpoint_every=1):
         """
         Args:
             model (nn.Module): PyTorch model to optimize.
@@ -20,12 +48,59 @@ class TaylorBSAOptimizer:
             low (float or Tensor): Lower bound for initialization.
             high (float or Tensor): Upper bound for initialization.
             device (str): Device to run optimization on.
+            noise_range (float): Half-width of the uniform noise around the model's
+                current weights used to spread the initial population.
+            keep_initial (bool): Keep bird 0 exactly at the model's current weights, so a
+                swarm seeded from a fine-tuned model never ends worse than it (hybrid mode).
+            vectorize (bool): Evaluate the whole population in one batched forward pass per
+                data batch (torch.func.vmap over functional_call) instead of one pass per bird.
+                Falls back to the per-bird loop if the model cannot be vmapped.
+            n_workers (int): Worker processes for fitness evaluation (CPU only). Each worker
+                holds its own model replica and reads the population from shared memory, so
+                only bird indices are sent per epoch. The pool is started on the first step
+                and restarted if the data loader or loss changes; call `close()` when done.
+                The model, data loader and loss must be picklable (no local classes or lambdas).
+            seed (int): Base seed of the workers. The task for chunk k in epoch t seeds torch
+                and NumPy with seed + t * n_workers + k, independent of scheduling.
+            fitness_mode (str): 'full' scores every bird on the whole data loader; 'halving'
+                races them with successive halving (see `_halving_fitness`). Halving runs
+                in-process and expects a shuffling loader, so each rung sees a random subsample.
+            halving_eta (int): Halving keeps the best 1/eta of the birds per rung and gives
+                the survivors eta times more batches.
+            min_batches (int): Batches every bird is scored on in the first halving rung.
+            checkpoint_path (str, optional): If set, `step` atomically writes `state_dict()`
+                here every `checkpoint_every` epochs (resume with `load_checkpoint`).
+            checkpoint_every (int): Checkpoint period in epochs.
         """
         self.model = model
         self.pop_size = population_size
         self.prob_foraging = prob_foraging
         self.prob_flight = prob_flight
         self.device = device
+        self.vectorize = vectorize
+        self.n_workers = n_workers
+        self.seed = seed
+        self.fitness_mode = fitness_mode
+        self.halving_eta = halving_eta
+        self.min_batches = min_batches
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.epoch = 0
+        self._pool = None
+        self._pool_key = None
+        
+        if fitness_mode not in ('full', 'halving'):
+            raise ValueError(f"Unknown fitness_mode '{fitness_mode}' (expected 'full' or 'halving').")
+        if n_workers > 1 and torch.device(device).type != 'cpu':
+            raise ValueError("n_workers > 1 requires device='cpu' (shared-memory population).")
+        
+        # Parameter names/shapes in parameters_to_vector order, to unflatten the population
+        self.param_shapes = [(name, p.shape) for name, p in self.model.named_parameters()]
+        
+        # Identifies the swarm configuration a checkpoint belongs to (see load_state_dict)
+        config = (self.param_shapes, population_size, prob_foraging, prob_flight, noise_range,
+                  keep_initial, fitness_mode, halving_eta, min_batches, seed)
+        self.fingerprint = hashlib.sha1(repr(config).encode()).hexdigest()
         
         # Flatten parameters
         self.initial_params = parameters_to_vector(self.model.parameters()).detach().to(device)
@@ -35,11 +110,14 @@ class TaylorBSAOptimizer:
         # Random noise around initial weights or uniform initialization?
         # Prompt: "initialized with random noise around the model's current weights"
         # We'll use uniform noise around the initial weights.
-        noise_range = 0.5 # Adjustable
-        
         self.population = self.initial_params.unsqueeze(0).repeat(population_size, 1) # (N, D)
         noise = (torch.rand(population_size, self.num_params, device=device) * 2 - 1) * noise_range
+        if keep_initial:
+            noise[0] = 0.0
         self.population += noise
+        if n_workers > 1:
+            # Workers map this storage once; step() updates it in place
+            self.population.share_memory_()
         
         self.best_solution = self.initial_params.clone()
         self.best_fitness = float('inf')
@@ -50,7 +128,13 @@ class TaylorBSAOptimizer:
         # Shape: (History_Depth, N, D)
         # Depth=4 (t, t-1, t-2, t-3). t is self.population.
         # We store t-1, t-2, t-3 explicitly.
-        self.history = torch.stack([self.population.clone() for _ in range(3)]) # Indices 0->t-1, 1->t-2, 2->t-3
+        # Ring buffer: history[(history_head + j) % 3] is t-1-j, so a step overwrites the
+        # oldest slot in place instead of shifting (cloning) all three.
+        self.history = torch.stack([self.population.clone() for _ in range(3)])
+        self.history_head = 0
+        
+        # Scratch (5, N, D) for the position update, allocated on the first step
+        self._workspace = None
     
     def _evaluate_fitness(self, weights_vector, data_loader, loss_fn):
         """
@@ -74,6 +158,160 @@ class TaylorBSAOptimizer:
         
         return total_loss / len(data_loader)
 
+    def _unflatten(self, population):
+        """
+        Split a (P, D) population into {name: (P, *shape)} views, one per parameter.
+        """
+        params, offset = {}, 0
+        for name, shape in self.param_shapes:
+            numel = shape.numel()
+            params[name] = population[:, offset:offset + numel].view(-1, *shape)
+            offset += numel
+        return params
+
+    def _batched_loss(self, loss_fn):
+        """
+        vmapped loss: ({name: (P, *shape)}, data, target) -> (P,).
+        """
+        def bird_loss(bird_params, data, target):
+            return loss_fn(functional_call(self.model, bird_params, (data,)), target)
+        
+        return vmap(bird_loss, in_dims=(0, None, None))
+
+    def _batch_losses(self, population, data, target, loss_fn):
+        """
+        Loss of every bird in `population` (P, D) on one batch, shape (P,).
+        """
+        if self.vectorize:
+            try:
+                return self._batched_loss(loss_fn)(self._unflatten(population), data, target)
+            except Exception as e:
+                print(f"[WARN] Vectorized fitness failed ({e}); falling back to per-bird evaluation.")
+                self.vectorize = False
+        
+        losses = []
+        for weights in population:
+            vector_to_parameters(weights, self.model.parameters())
+            losses.append(loss_fn(self.model(data), target).item())
+        return torch.tensor(losses, device=self.device)
+
+    def _halving_fitness(self, data_loader, loss_fn):
+        """
+        Successive halving ("racing") fitness.
+        
+        All birds are scored on the first `min_batches` batches; the best 1/eta are
+        promoted and scored on eta times as many batches (reusing the ones already
+        seen), and so on until the survivors have seen the whole loader. The final
+        rung therefore confirms the best birds on the full data, while clearly bad
+        birds cost only a few batches.
+        
+        Returns:
+            tuple: (fitness (P,), confirmed (P,) bool). Eliminated birds keep their
+            subsample estimate; `confirmed` marks birds scored on every batch.
+        """
+        n_batches = len(data_loader)
+        totals = torch.zeros(self.pop_size, device=self.device)
+        fitness = torch.empty(self.pop_size, device=self.device)
+        alive = torch.arange(self.pop_size, device=self.device)
+        
+        batches = iter(data_loader)
+        seen, budget = 0, self.min_batches
+        self.model.eval()
+        with torch.no_grad():
+            while True:
+                budget = min(budget, n_batches)
+                population = self.population[alive]
+                for _ in range(budget - seen):
+                    data, target = next(batches)
+                    data, target = data.to(self.device), target.to(self.device)
+                    totals[alive] += self._batch_losses(population, data, target, loss_fn)
+                seen = budget
+                fitness[alive] = totals[alive] / seen
+                
+                if seen == n_batches:
+                    break
+                # Promote the best 1/eta of the birds to an eta times larger subsample
+                keep = max(1, -(-alive.numel() // self.halving_eta))
+                alive = alive[torch.argsort(fitness[alive])[:keep]]
+                budget *= self.halving_eta
+        
+        confirmed = torch.zeros(self.pop_size, dtype=torch.bool, device=self.device)
+        confirmed[alive] = True
+        return fitness, confirmed
+
+    def _evaluate_population(self, population, data_loader, loss_fn):
+        """
+        Evaluates fitness (mean batch loss) of every bird at once.
+        
+        Each data batch goes through a single vmapped forward pass over the stacked
+        parameters, so the per-epoch cost is one pass over the data instead of P
+        (per-bird evaluation if vectorize is off or vmap fails, see `_batch_losses`).
+        
+        Returns:
+            Tensor: Fitness per bird, shape (P,).
+        """
+        self.model.eval()
+        total_loss = torch.zeros(population.size(0), device=self.device)
+        with torch.no_grad():
+            for data, target in data_loader:
+                data, target = data.to(self.device), target.to(self.device)
+                total_loss += self._batch_losses(population, data, target, loss_fn)
+        
+        return total_loss / len(data_loader)
+
+    def _population_fitness(self, data_loader, loss_fn, indices=None):
+        """
+        Fitness of the current population, or of the birds `indices`, shape (P,).
+        Uses the worker pool if n_workers > 1, else vectorized evaluation when possible.
+        """
+        if indices is None and self.n_workers > 1:
+            return self._parallel_fitness(data_loader, loss_fn)
+        
+        population = self.population if indices is None else self.population[indices]
+        return self._evaluate_population(population, data_loader, loss_fn)
+
+    def _get_pool(self, data_loader, loss_fn):
+        """
+        Start (or restart, if the data or loss changed) the fitness worker pool.
+        """
+        key = (id(data_loader), id(loss_fn))
+        if self._pool is None or self._pool_key != key:
+            self.close()
+            num_threads = max(1, torch.get_num_threads() // self.n_workers)
+            self._pool = mp.get_context('spawn').Pool(
+                self.n_workers, initializer=_init_fitness_worker,
+                initargs=(self, data_loader, loss_fn, num_threads))
+            self._pool_key = key
+        return self._pool
+
+    def _parallel_fitness(self, data_loader, loss_fn):
+        """
+        Split the population into one contiguous chunk per worker and gather the fitness.
+        """
+        pool = self._get_pool(data_loader, loss_fn)
+        chunks = [c.tolist() for c in np.array_split(np.arange(self.pop_size), self.n_workers) if len(c)]
+        seeds = [self.seed + self.epoch * self.n_workers + k for k in range(len(chunks))]
+        results = pool.starmap(_worker_fitness, zip(chunks, seeds))
+        return torch.tensor([f for chunk in results for f in chunk], device=self.device)
+
+    def close(self):
+        """
+        Shut down the fitness worker pool (if any).
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+            self._pool_key = None
+
+    def __getstate__(self):
+        # The pool itself never travels to workers
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pool_key'] = None
+        state['_workspace'] = None
+        return state
+
     def step(self, data_loader, loss_fn):
         """
         Execute one optimization step (epoch).
@@ -85,83 +323,70 @@ class TaylorBSAOptimizer:
         Returns:
             best_fitness (float): Best loss achieved so far.
         """
-        current_fitnesses = []
-        
         # 1. Evaluate Fitness of current population
-        for i in range(self.pop_size):
-            fitness = self._evaluate_fitness(self.population[i], data_loader, loss_fn)
-            current_fitnesses.append(fitness)
-            
-            # Update Global Best
-            if fitness < self.best_fitness:
-                self.best_fitness = fitness
-                self.best_solution = self.population[i].clone()
+        if self.fitness_mode == 'halving':
+            current_fitnesses, confirmed = self._halving_fitness(data_loader, loss_fn)
+            # Only full-data scores are comparable with best_fitness
+            candidates = current_fitnesses.masked_fill(~confirmed, float('inf'))
+        else:
+            current_fitnesses = candidates = self._population_fitness(data_loader, loss_fn)
         
-        current_fitnesses = torch.tensor(current_fitnesses, device=self.device)
+        # Update Global Best
+        best_idx = int(torch.argmin(candidates))
+        if candidates[best_idx].item() < self.best_fitness:
+            self.best_fitness = candidates[best_idx].item()
+            self.best_solution = self.population[best_idx].clone()
         
-        # 2. Update Positions
-        new_population = self.population.clone()
+        # 2. Update Positions (all birds at once)
+        x = self.population
+        P = self.pop_size
+        if self._workspace is None:
+            self._workspace = torch.empty(5, P, self.num_params, device=self.device)
+        new_population, flight_pos, diff_best, diff_other, r = self._workspace
         
-        # History references
-        # history[0] is t-1, history[1] is t-2, history[2] is t-3
-        pos_t_minus_1 = self.history[0]
-        pos_t_minus_2 = self.history[1]
-        pos_t_minus_3 = self.history[2]
+        # History references: t-1, t-2, t-3 slots of the ring buffer
+        pos_t_minus_1, pos_t_minus_2, pos_t_minus_3 = (self.history[(self.history_head + j) % 3] for j in range(3))
         
-        for i in range(self.pop_size):
-            r = np.random.rand()
-            
-            if r < self.prob_foraging:
-                # --- Foraging (Taylor Series Update) ---
-                # new_pos = 0.5*pos_t + 1.3591*pos_t_minus_1 - 1.359*pos_t_minus_2 + 0.6795*pos_t_minus_3
-                # Coefficients from Alhassan (2020)
-                update = 0.5 * self.population[i] + \
-                         1.3591 * pos_t_minus_1[i] - \
-                         1.359 * pos_t_minus_2[i] + \
-                         0.6795 * pos_t_minus_3[i]
-                         
-                new_population[i] = update
-                
-            else:
-                # --- Vigilance or Flight (Standard BSA) ---
-                # Standard BSA logic for non-foraging behavior
-                # Divide into vigilance and flight
-                if np.random.rand() < self.prob_flight:
-                    # Flight (Move towards random position or similar)
-                    # BSA Flight: x_new = x + randn * x
-                    # Or towards random other bird?
-                    # Standard BSA Flight equation:
-                    # x_new = x + FL * (best - x) ?? No that's PSO-ish.
-                    # Simplified Flight: Move towards random position in search space.
-                    # Let's use: x_new = x + randn * (best - x) + randn * (x - mean)
-                    
-                    # We'll use a simplified version: Random step
-                    step_size = torch.randn(self.num_params, device=self.device)
-                    new_population[i] = self.population[i] + step_size
-                else:
-                    # Vigilance
-                    # Move towards best
-                    k = np.random.randint(self.pop_size) # Random other bird
-                    while k == i: k = np.random.randint(self.pop_size)
-                    
-                    # BSA Vigilance equation approximates:
-                    # x_new = x + rand * (best - x) + rand * (best - x_k)
-                    r1 = torch.rand(self.num_params, device=self.device)
-                    r2 = torch.rand(self.num_params, device=self.device)
-                    
-                    diff_best = self.best_solution - self.population[i]
-                    diff_other = self.best_solution - self.population[k]
-                    
-                    new_population[i] = self.population[i] + r1 * diff_best + r2 * diff_other
+        # Behaviour masks for the whole swarm in one draw
+        # Foraging with prob_foraging; otherwise flight with prob_flight, else vigilance
+        draws = torch.rand(2, P, 1, device=self.device)
+        foraging = draws[0] < self.prob_foraging
+        flight = ~foraging & (draws[1] < self.prob_flight)
+        vigilance = ~foraging & ~flight
+        
+        # --- Foraging (Taylor Series Update) ---
+        # new_pos = 0.5*pos_t + 1.3591*pos_t_minus_1 - 1.359*pos_t_minus_2 + 0.6795*pos_t_minus_3
+        # Coefficients from Alhassan (2020)
+        torch.mul(x, 0.5, out=new_population)
+        new_population.add_(pos_t_minus_1, alpha=1.3591)
+        new_population.add_(pos_t_minus_2, alpha=-1.359)
+        new_population.add_(pos_t_minus_3, alpha=0.6795)
+        
+        # --- Flight (simplified BSA): random step x + randn ---
+        flight_pos.normal_().add_(x)
+        
+        # --- Vigilance: x_new = x + r1 * (best - x) + r2 * (best - x_k), k a random other bird ---
+        k = (torch.arange(P, device=self.device) + torch.randint(1, max(P, 2), (P,), device=self.device)) % P
+        torch.sub(self.best_solution, x, out=diff_best).mul_(r.uniform_())
+        torch.index_select(x, 0, k, out=diff_other)
+        diff_other.neg_().add_(self.best_solution).mul_(r.uniform_())
+        diff_best.add_(diff_other).add_(x)
+        
+        torch.where(flight, flight_pos, new_population, out=new_population)
+        torch.where(vigilance, diff_best, new_population, out=new_population)
 
         # 3. Update History Buffer
-        # Shift history: t-2 -> t-3, t-1 -> t-2, t -> t-1
-        self.history[2] = self.history[1].clone()
-        self.history[1] = self.history[0].clone()
-        self.history[0] = self.population.clone()
+        # The t-3 slot becomes t-1: overwrite it in place and move the head back one slot
+        self.history_head = (self.history_head - 1) % 3
+        self.history[self.history_head].copy_(x)
         
         # 4. Apply Updates
-        self.population = new_population
+        # In place, so worker processes keep seeing the same (shared) storage
+        self.population.copy_(new_population)
+        self.epoch += 1
+        
+        if self.checkpoint_path is not None and self.epoch % self.checkpoint_every == 0:
+            self.save_checkpoint(self.checkpoint_path)
         
         # Optional: Boundary check? (Not specified, assuming unbounded or regularized by physics)
         
@@ -169,3 +394,77 @@ class TaylorBSAOptimizer:
         vector_to_parameters(self.best_solution, self.model.parameters())
         
         return self.best_fitness
+
+    def state_dict(self):
+        """
+        Full optimizer state, including the global torch and NumPy RNG states, so a
+        resumed run continues exactly as an uninterrupted one would.
+        
+        Returns:
+            dict: fingerprint, population, history, history_head, best_solution,
+            best_fitness, epoch, vectorize, torch_rng_state, numpy_rng_state.
+        """
+        return {
+            'fingerprint': self.fingerprint,
+            'population': self.population.clone(),
+            'history': self.history.clone(),
+            'history_head': self.history_head,
+            'best_solution': self.best_solution.clone(),
+            'best_fitness': self.best_fitness,
+            'epoch': self.epoch,
+            'vectorize': self.vectorize,
+            'torch_rng_state': torch.get_rng_state(),
+            'numpy_rng_state': np.random.get_state(),
+        }
+
+    def load_state_dict(self, state):
+        """
+        Restore a state produced by `state_dict()` (also reseeds the global RNGs and
+        loads best_solution into the model). Refuses a state written by an optimizer
+        with a different configuration (model shapes or swarm hyperparameters).
+        """
+        if state.get('fingerprint') != self.fingerprint:
+            raise ValueError("Checkpoint was written by a differently configured optimizer "
+                             f"(fingerprint {state.get('fingerprint')}, expected {self.fingerprint}).")
+        if state['population'].shape != self.population.shape:
+            raise ValueError(f"Population shape mismatch: checkpoint {tuple(state['population'].shape)}, "
+                             f"optimizer {tuple(self.population.shape)}.")
+        
+        # Copy into the existing tensors (the population may be shared with workers)
+        self.population.copy_(state['population'])
+        self.history.copy_(state['history'])
+        self.history_head = state['history_head']
+        self.best_solution = state['best_solution'].to(self.device).clone()
+        self.best_fitness = state['best_fitness']
+        self.epoch = state['epoch']
+        self.vectorize = state['vectorize']
+        
+        torch.set_rng_state(state['torch_rng_state'])
+        np.random.set_state(state['numpy_rng_state'])
+        
+        vector_to_parameters(self.best_solution, self.model.parameters())
+
+    def save_checkpoint(self, path):
+        """
+        Write `state_dict()` to `path` atomically: a temp file in the same directory
+        is renamed over the target, so a crash never leaves a partial checkpoint.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bsa_ckpt_")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                torch.save(self.state_dict(), f)
+                f.flush()
+                os.fsync(f.fileno()) # Data on disk before the rename makes it visible
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load_checkpoint(self, path):
+        """
+        Resume from a checkpoint written by `save_checkpoint`.
+        """
+        # weights_only=False: the NumPy RNG state is a tuple with an ndarray
+        self.load_state_dict(torch.load(path, map_location=self.device, weights_only=False))
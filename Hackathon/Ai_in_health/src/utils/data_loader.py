@@ -30,6 +30,7 @@ class HeartDiseaseDataLoader:
         self.data_dir = data_dir
         self.data_path = os.path.join(data_dir, "processed.cleveland.data")
         self.df = None
+        self.scaler = None # Fitted StandardScaler (feature columns), set by normalize_features
         self.train_loader = None
         self.test_loader = None
         
@@ -113,8 +114,8 @@ class HeartDiseaseDataLoader:
              raise ValueError("Data not loaded. Call load_data() first.")
         
         features = self.df.columns.drop('target')
-        scaler = StandardScaler()
-        self.df[features] = scaler.fit_transform(self.df[features])
+        self.scaler = StandardScaler()
+        self.df[features] = self.scaler.fit_transform(self.df[features])
         print("[INFO] Features normalized.")
 
     def get_loaders(self, batch_size=32, split_ratio=0.8):
@@ -86,6 +86,120 @@ def verify_sparse_fcm():
     else:
         print(f"[WARN] Predicted {len(np.unique(preds))} clusters (expected {centers}).")
         
+    # 6. Check Chunked Fit (must match the dense path)
+    chunked = SparseFCM(n_clusters=centers, m=2.0, max_iter=50, lambda_reg=0.01, chunk_size=37)
+    chunked.fit(X_scaled)
+    
+    if np.allclose(chunked.u, model.u) and np.allclose(chunked.w, model.w):
+        print("[OK] Chunked fit matches dense fit.")
+    else:
+        print("[FAIL] Chunked fit diverged from dense fit.")
+        
+    # 7. Check Closed-Form Membership Kernel (parity with the pairwise formula)
+    d_sq = np.random.rand(500, 12) + 1e-3
+    for m in (1.5, 2.0, 3.0):
+        kernel = SparseFCM(n_clusters=12, m=m)
+        if not np.allclose(kernel._membership_closed_form(d_sq), kernel._membership_pairwise(d_sq)):
+            print(f"[FAIL] Closed-form membership differs from pairwise formula (m={m}).")
+            break
+    else:
+        print("[OK] Closed-form membership matches pairwise formula.")
+    
+    proba = model.predict_proba(X_scaled)
+    if np.allclose(proba.sum(axis=1), 1.0) and np.array_equal(proba.argmax(axis=1), preds):
+        print("[OK] predict_proba consistent with predict.")
+    else:
+        print("[FAIL] predict_proba inconsistent with predict.")
+        
+    # 8. Check Online Updates (partial_fit over mini-batches)
+    online = SparseFCM(n_clusters=centers, m=2.0, lambda_reg=0.01, decay=0.9)
+    for start in range(0, n_samples, 50):
+        online.partial_fit(X_scaled[start:start + 50])
+    
+    if online.n_samples_seen == n_samples and np.mean(online.w[:n_informative]) > np.mean(online.w[n_informative:]):
+        print("[OK] partial_fit tracks informative features.")
+    else:
+        print("[WARN] partial_fit weights do not favour informative features.")
+        
+    # 9. Check Parallel Restarts (shared-memory process pool vs in-process)
+    serial = SparseFCM(n_clusters=centers, m=2.0, max_iter=50, lambda_reg=0.01, n_init=4, n_jobs=1)
+    serial.fit(X_scaled)
+    parallel = SparseFCM(n_clusters=centers, m=2.0, max_iter=50, lambda_reg=0.01, n_init=4, n_jobs=2)
+    parallel.fit(X_scaled)
+    
+    same_restarts = np.allclose([r['objective'] for r in serial.restarts],
+                                [r['objective'] for r in parallel.restarts])
+    if same_restarts and np.allclose(parallel.u, serial.u) and \
+            np.allclose(parallel.u, parallel._membership_matrix(X_scaled)):
+        print("[OK] n_jobs=2 restarts match n_jobs=1 (objectives and kept memberships).")
+    else:
+        print("[FAIL] Parallel restarts differ from serial restarts.")
+        
+    # 10. Check Sparse (CSR) Input against Dense
+    import scipy.sparse as sp
+    X_sparse_dense = np.where(np.random.rand(n_samples, 40) < 0.1, np.random.rand(n_samples, 40), 0.0)
+    X_csr = sp.csr_matrix(X_sparse_dense)
+    um = np.random.rand(n_samples, centers) ** 2.0
+    kernel = SparseFCM(n_clusters=centers)
+    kernel.v, kernel.w = np.random.rand(centers, 40), np.random.dirichlet(np.ones(40))
+    
+    dist_ok = np.allclose(kernel._weighted_sq_dist(X_csr), kernel._weighted_sq_dist(X_sparse_dense), atol=1e-12)
+    disp_ok = np.allclose(kernel._dispersion_block(X_csr, um), kernel._dispersion_block(X_sparse_dense, um), atol=1e-12)
+    
+    sparse_model = SparseFCM(n_clusters=centers, max_iter=30, lambda_reg=0.01)
+    sparse_model.fit(X_csr)
+    dense_model = SparseFCM(n_clusters=centers, max_iter=30, lambda_reg=0.01)
+    dense_model.fit(X_sparse_dense)
+    fit_ok = np.allclose(sparse_model.u, dense_model.u) and np.allclose(sparse_model.w, dense_model.w)
+    
+    if dist_ok and disp_ok and fit_ok:
+        print("[OK] CSR input matches dense (distances, dispersion and fit).")
+    else:
+        print(f"[FAIL] CSR/dense mismatch: distances={dist_ok} dispersion={disp_ok} fit={fit_ok}")
+    
+    # 11. Check Save -> Load Round Trip (NumPy and torch artifacts)
+    import tempfile
+    import torch
+    from algorithms.sparse_fcm_torch import TorchSparseFCM
+    torch_model = TorchSparseFCM(n_clusters=centers, m=2.0, max_iter=50, lambda_reg=0.01, dtype=torch.float64)
+    torch_model.fit(X_scaled)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, fitted in (('SparseFCM', model), ('TorchSparseFCM', torch_model)):
+            path = os.path.join(tmp, f"{name}.npz")
+            fitted.save(path)
+            loaded = SparseFCM.load(path)
+            try:
+                same_proba = np.allclose(loaded.predict_proba(X_scaled), np.asarray(fitted.predict_proba(X_scaled)))
+                loaded.partial_fit(X_scaled[:50])
+            except Exception as e:
+                print(f"[FAIL] {name} save -> load -> predict/partial_fit failed: {e}")
+                continue
+            if same_proba and loaded.n_samples_seen == n_samples + 50:
+                print(f"[OK] {name} save -> load -> predict/partial_fit round trip.")
+            else:
+                print(f"[FAIL] {name} round trip changed predictions or statistics.")
+        
+    # 12. Check the Regularization Path (selections, collapse flag, warm-start savings)
+    lambdas = [0.0, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5]
+    path = SparseFCM(n_clusters=centers, m=2.0, max_iter=100).fit_path(X_scaled, lambdas)
+    cold_iters = []
+    for lam in lambdas:
+        cold = SparseFCM(n_clusters=centers, m=2.0, max_iter=100, lambda_reg=lam)
+        cold.fit(X_scaled)
+        cold_iters.append(cold.n_iter)
+    
+    mid = [entry for entry in path if 0 < entry['lambda_reg'] <= 0.1]
+    selections_ok = all(set(entry['selected']) == set(range(n_informative)) and not entry['collapsed'] for entry in mid)
+    collapse_ok = path[-1]['collapsed'] and len(path[-1]['selected']) == 0
+    warm_iters = sum(entry['n_iter'] for entry in path[1:])
+    if selections_ok and collapse_ok and warm_iters < sum(cold_iters[1:]):
+        print(f"[OK] fit_path selects the informative features, flags the collapse at lambda={lambdas[-1]} "
+              f"and warm starts save iterations ({warm_iters} vs {sum(cold_iters[1:])}).")
+    else:
+        print(f"[FAIL] fit_path: selections={selections_ok} collapse={collapse_ok} "
+              f"iterations {warm_iters} warm vs {sum(cold_iters[1:])} cold")
+        
     print("\n[SUCCESS] SparseFCM verification pipeline finished.")
 
 if __name__ == "__main__":
@@ -8,7 +8,23 @@ from torch.utils.data import DataLoader, TensorDataset
 # Add src to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
-from algorithms.dbn import DBN, RBM
+from algorithms.dbn import DBN, RBM, parity_report
+
+class MeanFieldRBM(RBM):
+    """
+    RBM that carries probabilities instead of binary samples, so a CD step is
+    deterministic (module-level so spawned workers can unpickle it).
+    """
+    def sample_hidden(self, v, beta=1.0):
+        h_prob, _ = super().sample_hidden(v, beta)
+        return h_prob, h_prob
+    
+    def sample_visible(self, h, beta=1.0):
+        v_prob, _ = super().sample_visible(h, beta)
+        return v_prob, v_prob
+
+def halving_schedule(epoch):
+    return 0.5 ** epoch
 
 def verify_dbn():
     print("--- Verifying DBN and RBM Implementation ---")
@@ -52,6 +68,38 @@ def verify_dbn():
         # traceback.print_exc()
         return
 
+    # Early stopping: with min_delta above any possible gain, every layer stops after
+    # its first epoch plus `patience`; a zero lr schedule freezes the momentum/decay update
+    torch.manual_seed(0)
+    stopping = DBN(input_dim=6, hidden_dims=[4, 2], output_dim=2, k=1)
+    W_before = [rbm.W.detach().clone() for rbm in stopping.rbm_layers]
+    history = stopping.pretrain(loader, epochs=10, lr=0.1, momentum=0.9, weight_decay=0.1,
+                                lr_schedule=lambda epoch: 0.0, patience=2, min_delta=100.0)
+    unchanged = all(torch.equal(a, rbm.W) for a, rbm in zip(W_before, stopping.rbm_layers))
+    if [len(layer) for layer in history] == [3, 3] and unchanged:
+        print("[OK] patience stops each layer early (3 of 10 epochs); zero lr schedule leaves W unchanged.")
+    else:
+        print(f"[FAIL] Early stopping/schedule: epochs per layer {[len(layer) for layer in history]}, "
+              f"W unchanged={unchanged}")
+
+    # Cached layer inputs ('memory' / 'mmap') must train exactly like the on-the-fly path
+    # on a shuffled loader; mmap files in a caller-supplied cache_dir are cleaned up
+    import tempfile
+    weights = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for cache in ('none', 'memory', 'mmap'):
+            torch.manual_seed(0)
+            cached_dbn = DBN(input_dim=6, hidden_dims=[4, 3, 2], output_dim=2, k=1)
+            cached_dbn.pretrain(DataLoader(dataset, batch_size=10, shuffle=True), epochs=2, lr=0.1,
+                                cache=cache, cache_dir=cache_dir)
+            weights[cache] = [rbm.W.detach().clone() for rbm in cached_dbn.rbm_layers]
+        leftovers = os.listdir(cache_dir)
+    same = all(torch.allclose(a, b) for cache in ('memory', 'mmap') for a, b in zip(weights['none'], weights[cache]))
+    if same and not leftovers:
+        print("[OK] cache='memory'/'mmap' match cache='none' on a shuffled loader; no cache files left.")
+    else:
+        print(f"[FAIL] Cached pretraining mismatch ({same}) or leftover cache files {leftovers}.")
+
     # 4. Test Forward Pass
     print("\n--- Testing Forward Pass ---")
     try:
@@ -76,6 +124,140 @@ def verify_dbn():
     except Exception as e:
          print(f"[FAIL] Forward pass failed: {e}")
          return
+    
+    # Fine-tuning: RBM weights stay fixed for freeze_epochs while the classifier moves,
+    # then train with their own learning rate (rbm_lr_scale)
+    torch.manual_seed(0)
+    tuned = DBN(input_dim=6, hidden_dims=[4, 2], output_dim=2, k=1)
+    rbm_before = [p.detach().clone() for p in tuned.rbm_layers.parameters()]
+    head_before = tuned.classifier.weight.detach().clone()
+    tuned.finetune(loader, epochs=2, lr=1e-2, freeze_epochs=2)
+    frozen = all(torch.equal(a, b) for a, b in zip(rbm_before, tuned.rbm_layers.parameters()))
+    head_moved = not torch.equal(head_before, tuned.classifier.weight)
+    history = tuned.finetune(loader, epochs=2, lr=1e-2, freeze_epochs=1, rbm_lr_scale=0.1)
+    unfrozen = not torch.equal(rbm_before[0], tuned.rbm_layers[0].W)
+    if frozen and head_moved and unfrozen and len(history) == 2:
+        print("[OK] finetune keeps RBM weights fixed during freeze_epochs and trains the classifier.")
+    else:
+        print(f"[FAIL] finetune: RBMs frozen={frozen} classifier moved={head_moved} unfrozen later={unfrozen}")
+    
+    # Persistent chains ('pcd') survive across batches and grow with the batch size
+    torch.manual_seed(0)
+    pcd = RBM(6, 4, sampler='pcd')
+    pcd.cd_step(X[:10])
+    chains = pcd.fantasy_hidden.clone()
+    pcd.cd_step(X[:4]) # Smaller batch: only the first 4 chains advance
+    kept = pcd.fantasy_hidden.shape == (10, 4) and torch.equal(pcd.fantasy_hidden[4:], chains[4:])
+    pcd.cd_step(X[:16]) # Larger batch: 6 new chains are appended, the old ones carry on
+    grown = pcd.fantasy_hidden.shape == (16, 4)
+    
+    # Parallel tempering: the beta = 1 chain stays at index 0 through the swaps. With
+    # W = 0 and b_v = 6, p(v=1) is sigmoid(6 * beta), so only index 0 reaches ~0.9975.
+    pt = RBM(6, 4, k=5, sampler='pt', n_temperatures=4)
+    with torch.no_grad():
+        pt.W.zero_()
+        pt.visible_bias.fill_(6.0)
+        for batch_size in (300, 500): # Second batch grows the (T, chains, hidden) buffer
+            _, h0 = pt.sample_hidden(torch.bernoulli(torch.full((batch_size, 6), 0.5)))
+            vk, hk_prob = pt._negative_phase(h0)
+    tempered = pt.fantasy_hidden.shape == (4, 500, 4) and vk.mean().item() > 0.99 and \
+        torch.allclose(hk_prob, pt.forward(vk))
+    if kept and grown and tempered:
+        print("[OK] PCD chains persist and grow across batches; PT keeps the beta=1 chain at index 0.")
+    else:
+        print(f"[FAIL] Persistent samplers: pcd kept={kept} grown={grown} pt={tempered} "
+              f"(p(v=1) at index 0: {vk.mean().item():.4f})")
+    
+    # Gaussian visible chains: mean field for CD, tempered samples for PT
+    from algorithms.dbn import GaussianRBM
+    h = torch.bernoulli(torch.full((3, 100, 4), 0.5))
+    betas = torch.tensor([1.0, 0.3, 0.1]).view(3, 1, 1)
+    pt_rbm = GaussianRBM(6, 4, sampler='pt', n_temperatures=3)
+    cd_rbm = GaussianRBM(6, 4, sampler='cd')
+    cd_rbm.load_state_dict(pt_rbm.state_dict())
+    v_mean = cd_rbm._visible_state(h[0])
+    spread = (pt_rbm._visible_state(h, beta=betas) - pt_rbm._reconstruct(h)).var(dim=(1, 2))
+    # Scalar (Python float) beta, as accepted by RBM.sample_visible
+    scalar_mean, scalar_sample = pt_rbm.sample_visible(h[0], beta=0.25)
+    scalar_spread = (scalar_sample - scalar_mean).var().item()
+    if torch.allclose(v_mean, pt_rbm._reconstruct(h[0])) and torch.allclose(spread, 1 / betas.view(3), rtol=0.3) \
+            and abs(scalar_spread - 4.0) < 1.2:
+        print("[OK] Gaussian PT chains sample p(v|h) with variance 1/beta (tensor and float beta).")
+    else:
+        print(f"[FAIL] Gaussian visible chain variances {spread.tolist()} / {scalar_spread:.2f} (expected 1/beta).")
+         
+    # 5. Test TorchScript Export
+    print("\n--- Testing TorchScript Export ---")
+    try:
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dbn.pt")
+            dbn.export(path, feature_names=[f"f{i}" for i in range(6)],
+                       input_mean=[0.5] * 6, input_scale=[2.0] * 6)
+            scripted, config = DBN.load_exported(path)
+        if torch.allclose(scripted(X), dbn(X)) and config['hidden_dims'] == [4, 2] and \
+                config['input_mean'] == [0.5] * 6 and config['input_scale'] == [2.0] * 6:
+            print("[OK] Exported model matches the DBN and carries its config.")
+        else:
+            print("[FAIL] Exported model or config mismatch.")
+    except Exception as e:
+        print(f"[FAIL] Export failed: {e}")
+        return
+    
+    # 6. Test Inference Variants
+    print("\n--- Testing Inference Variants ---")
+    report = parity_report(dbn, {'fused': dbn.inference_model(), 'int8': dbn.inference_model(quantize=True)},
+                           DataLoader(dataset, batch_size=50))
+    if report['fused']['max_abs_diff'] < 1e-5:
+        print("[OK] Fused-sigmoid model matches the float DBN.")
+    else:
+        print(f"[FAIL] Fused-sigmoid logits differ by {report['fused']['max_abs_diff']:.2e}")
+    print(f"[INFO] int8 agreement with float predictions: {report['int8']['agreement']:.2%}")
+    
+    # 7. Test Top-down Generation
+    print("\n--- Testing Generation ---")
+    chunks = list(dbn.generate(25, gibbs_steps=20, batch_size=10, seed=1))
+    samples = torch.cat(chunks)
+    if [c.size(0) for c in chunks] == [10, 10, 5] and samples.shape == (25, 6) and \
+            torch.equal(samples, torch.cat(list(dbn.generate(25, gibbs_steps=20, batch_size=10, seed=1)))):
+        print("[OK] Generated chunks have the right shapes and are reproducible.")
+    else:
+        print("[FAIL] Generation chunking or seeding incorrect.")
+    
+    # 8. Test Sharded (multi-process) Pretraining
+    print("\n--- Testing Distributed Pretraining (2 workers) ---")
+    try:
+        dist_dbn = DBN(input_dim=6, hidden_dims=[4, 2], output_dim=2, k=1)
+        W_before = dist_dbn.rbm_layers[0].W.clone()
+        history = dist_dbn.pretrain_distributed(dataset, world_size=2, batch_size=10, epochs=2, lr=0.1)
+        if len(history) == 2 and not torch.equal(W_before, dist_dbn.rbm_layers[0].W):
+            print("[OK] Distributed pretraining updated the shared model.")
+        else:
+            print("[FAIL] Distributed pretraining did not update the model.")
+    except Exception as e:
+        print(f"[FAIL] Distributed pretraining failed: {e}")
+        return
+    
+    # All-reduced steps on 2 shards == single-process steps on the whole batch
+    # (mean-field chains, one batch of 20 rows per epoch, module-level lr_schedule)
+    import copy
+    torch.manual_seed(0)
+    single = DBN(input_dim=6, hidden_dims=[4], output_dim=2, k=1)
+    single.rbm_layers[0] = MeanFieldRBM(6, 4)
+    sharded = copy.deepcopy(single)
+    batch = TensorDataset(torch.rand(20, 6))
+    single.pretrain(DataLoader(batch, batch_size=20), epochs=2, lr=0.1, lr_schedule=halving_schedule)
+    sharded.pretrain_distributed(batch, world_size=2, batch_size=20, epochs=2, lr=0.1, lr_schedule=halving_schedule)
+    if all(torch.allclose(a, b, atol=1e-6) for a, b in zip(single.parameters(), sharded.parameters())):
+        print("[OK] world_size=2 updates match a single-process step on the full batch.")
+    else:
+        print("[FAIL] Distributed updates differ from the single-process step.")
+    
+    try:
+        sharded.pretrain_distributed(batch, world_size=2, batch_size=20, epochs=1, lr_schedule=lambda epoch: 1.0)
+        print("[FAIL] A lambda lr_schedule was sent to the workers.")
+    except ValueError:
+        print("[OK] Unpicklable pretrain_kwargs are rejected before spawning workers.")
          
     print("\n[SUCCESS] DBN verification complete.")
 
@@ -72,6 +72,108 @@ def verify_taylor_bsa():
     else:
         print(f"[FAIL] History buffer shape incorrect: {optimizer.history.shape}")
 
+    # Check the vectorized update and the history ring buffer against the per-bird
+    # reference formulas. The batches are a plain list (a DataLoader would draw a
+    # seed from the global RNG), so replaying the RNG state reproduces every draw.
+    swarm = TaylorBSAOptimizer(nn.Linear(1, 1), population_size=10, prob_foraging=0.4, prob_flight=0.5)
+    batches = [(X[i:i + 5], y[i:i + 5]) for i in range(0, 20, 5)]
+    P, D = swarm.pop_size, swarm.num_params
+    past = [swarm.population.clone() for _ in range(3)] # t-1, t-2, t-3
+    seen, update_ok, history_ok = set(), True, True
+    for _ in range(5):
+        x, rng_state = swarm.population.clone(), torch.get_rng_state()
+        swarm.step(batches, loss_fn)
+        best = swarm.best_solution
+
+        torch.set_rng_state(rng_state)
+        draws = torch.rand(2, P, 1)
+        noise = torch.randn(P, D)
+        k = (torch.arange(P) + torch.randint(1, P, (P,))) % P
+        r1, r2 = torch.rand(P, D), torch.rand(P, D)
+        for i in range(P):
+            if draws[0, i] < swarm.prob_foraging:
+                seen.add('foraging')
+                expected = 0.5 * x[i] + 1.3591 * past[0][i] - 1.359 * past[1][i] + 0.6795 * past[2][i]
+            elif draws[1, i] < swarm.prob_flight:
+                seen.add('flight')
+                expected = x[i] + noise[i]
+            else:
+                seen.add('vigilance')
+                expected = x[i] + r1[i] * (best - x[i]) + r2[i] * (best - x[k[i]])
+            update_ok &= torch.allclose(swarm.population[i], expected, atol=1e-5)
+
+        past = [x] + past[:2]
+        history_ok &= all(torch.equal(swarm.history[(swarm.history_head + j) % 3], past[j]) for j in range(3))
+    if update_ok and history_ok and seen == {'foraging', 'flight', 'vigilance'}:
+        print("[OK] Masked updates and history ring buffer match the per-bird reference formulas.")
+    else:
+        print(f"[FAIL] Reference mismatch: updates={update_ok} history={history_ok} behaviours={sorted(seen)}")
+
+    # Check vectorized fitness against the per-bird loop
+    vectorized = optimizer._evaluate_population(optimizer.population, loader, loss_fn)
+    looped = torch.tensor([optimizer._evaluate_fitness(optimizer.population[i], loader, loss_fn)
+                           for i in range(optimizer.pop_size)])
+    if torch.allclose(vectorized, looped, rtol=1e-4):
+        print("[OK] Vectorized population fitness matches per-bird evaluation.")
+    else:
+        print(f"[FAIL] Vectorized fitness mismatch: {vectorized} vs {looped}")
+
+    # Check successive-halving fitness: the reported best is confirmed on the full data
+    racing = TaylorBSAOptimizer(SimpleModel(), population_size=10, fitness_mode='halving')
+    racing_best = racing.step(loader, loss_fn)
+    confirmed = racing._evaluate_population(racing.best_solution.unsqueeze(0), loader, loss_fn).item()
+    if abs(racing_best - confirmed) < 1e-4 * max(1.0, confirmed):
+        print("[OK] Successive-halving best fitness confirmed on the full data.")
+    else:
+        print(f"[FAIL] Halving best {racing_best:.4f} != full-data fitness {confirmed:.4f}")
+
+    # Check checkpoint/resume reproducibility: 3 steps + resume + 3 steps == 6 steps
+    import tempfile
+    torch.manual_seed(0)
+    straight = TaylorBSAOptimizer(SimpleModel(), population_size=10)
+    for _ in range(6):
+        straight_best = straight.step(loader, loss_fn)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bsa.pt")
+        torch.manual_seed(0)
+        first = TaylorBSAOptimizer(SimpleModel(), population_size=10, checkpoint_path=path, checkpoint_every=3)
+        for _ in range(4):
+            first.step(loader, loss_fn) # The 4th step (after the checkpoint) is discarded by the resume
+        
+        resumed = TaylorBSAOptimizer(SimpleModel(), population_size=10)
+        resumed.load_checkpoint(path)
+        for _ in range(3):
+            resumed_best = resumed.step(loader, loss_fn)
+        
+        # A differently configured swarm must refuse the checkpoint
+        try:
+            TaylorBSAOptimizer(SimpleModel(), population_size=10, prob_flight=0.2).load_checkpoint(path)
+            print("[FAIL] Checkpoint of a different configuration was accepted.")
+        except ValueError:
+            print("[OK] Checkpoint of a different configuration is refused.")
+    
+    if resumed.epoch == 6 and resumed_best == straight_best and torch.equal(resumed.population, straight.population):
+        print("[OK] Resumed run reproduces the uninterrupted run.")
+    else:
+        print(f"[FAIL] Resume mismatch: best {resumed_best:.6f} vs {straight_best:.6f}")
+
+    # Check the spawn worker pool: workers must see in-place population updates
+    # (nn.Linear rather than SimpleModel, which a spawned process cannot unpickle)
+    pooled = TaylorBSAOptimizer(nn.Linear(1, 1), population_size=10, n_workers=2)
+    try:
+        before = pooled._population_fitness(loader, loss_fn) # Starts the pool
+        pooled.population.add_(torch.randn_like(pooled.population)) # Shared storage, updated in place
+        parallel = pooled._population_fitness(loader, loss_fn)
+        pooled.n_workers = 1
+        in_process = pooled._population_fitness(loader, loss_fn)
+    finally:
+        pooled.close()
+    if torch.allclose(parallel, in_process, rtol=1e-5) and not torch.allclose(parallel, before):
+        print("[OK] n_workers=2 fitness matches in-process fitness after a population update.")
+    else:
+        print(f"[FAIL] Worker pool fitness {parallel} vs in-process {in_process}")
+
     print("[SUCCESS] Taylor-BSA Verification Complete.")
 
 if __name__ == "__main__":